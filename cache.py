@@ -0,0 +1,117 @@
+"""Opt-in memoization of the per-polygon shape derivations.
+
+Obstacles tend to come back frame after frame, so to_star, to_octogon,
+to_pentagon, polygon2D and minimum_bounding_circle are worth caching. A
+GeometryCache keys every call on the geometry (a hash of its WKB, or a
+caller-supplied key function) plus the remaining arguments and keeps the
+most recently used results up to maxsize. Shapely geometries are immutable,
+so cached results are shared as they are.
+
+    from cache import to_pentagon      # same signature as playground.to_pentagon
+    cache.CACHE.info()                 # hits, misses, size
+
+WKB hashing costs about as much as polygon2D itself, so pass key= (e.g. a
+stable obstacle id lookup) when caching the cheap derivations.
+"""
+from collections import OrderedDict
+import functools
+import hashlib
+import inspect
+import threading
+from typing import Callable, Hashable
+
+import shapely
+
+import playground
+
+
+def wkb_key(geometry) -> bytes:
+    # 128 bit digest of the WKB, collisions are not a practical concern
+    return hashlib.blake2b(shapely.to_wkb(geometry), digest_size=16).digest()
+
+class GeometryCache(object):
+    '''Thread-safe bounded LRU cache for functions whose first argument is a geometry.'''
+
+    def __init__(self, maxsize: int = 4096, key: Callable[..., Hashable] = wkb_key):
+        self.maxsize = maxsize
+        self.key = key
+        self.hits = 0
+        self.misses = 0
+        self.uncached = 0 # calls whose arguments could not be hashed
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._data)
+
+    def info(self) -> dict:
+        return {'hits': self.hits, 'misses': self.misses, 'uncached': self.uncached,
+                'size': len(self._data), 'maxsize': self.maxsize}
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.hits = self.misses = self.uncached = 0
+
+    def get(self, key: Hashable, compute: Callable):
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return self._data[key]
+            self.misses += 1
+        # computed outside the lock; a concurrent miss on the same key just computes twice
+        value = compute()
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+        return value
+
+    def wrap(self, func: Callable) -> Callable:
+        '''Memoizes func(geometry, ...) in this cache, keeping its name, docstring and signature'''
+        signature = inspect.signature(func)
+        kinds = {p.name: p.kind for p in signature.parameters.values()}
+        name = f"{func.__module__}.{func.__qualname__}"
+
+        def flatten(name, value):
+            # *args and **kwargs bind to a tuple and a dict; key them as flat tuples
+            if kinds[name] == inspect.Parameter.VAR_KEYWORD:
+                return name, tuple(sorted(value.items()))
+            if kinds[name] == inspect.Parameter.VAR_POSITIONAL:
+                return name, tuple(value)
+            return name, value
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not args or not isinstance(args[0], shapely.Geometry):
+                # arrays and keyword geometries go straight through
+                return func(*args, **kwargs)
+            # bind so that to_octogon(p) and to_octogon(p, True) share an entry
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            params = tuple(flatten(*item) for item in bound.arguments.items())[1:]
+            try:
+                key = (name, self.key(args[0]), params)
+                hash(key)
+            except TypeError:
+                with self._lock:
+                    self.uncached += 1
+                return func(*args, **kwargs)
+            return self.get(key, lambda: func(*args, **kwargs))
+        wrapper.cache = self
+        return wrapper
+
+def memoize(maxsize: int = 4096, key: Callable[..., Hashable] = wkb_key) -> Callable:
+    '''Decorator giving a function its own GeometryCache, reachable as func.cache'''
+    return GeometryCache(maxsize, key).wrap
+
+
+# the derivations, memoized in one shared cache
+CACHE = GeometryCache()
+to_star = CACHE.wrap(playground.to_star)
+to_octogon = CACHE.wrap(playground.to_octogon)
+to_pentagon = CACHE.wrap(playground.to_pentagon)
+polygon2D = CACHE.wrap(playground.polygon2D)
+minimum_bounding_circle = CACHE.wrap(shapely.minimum_bounding_circle)
@@ -0,0 +1,122 @@
+"""Flat coordinate-buffer representation of edges.
+
+An EdgeBuffer keeps N edges as one contiguous (N, 2, D) float64 array, with
+optional integer ids (e.g. the polygon each edge came from), so edges move
+through the pipeline without a Python object per edge or coordinate.
+"""
+from pathlib import Path
+
+import numpy as np
+import shapely
+
+from playground import edge_lengths, edges_to_faces, edges_to_polygons, polygons_to_edges
+
+
+def _dim(coords: np.ndarray) -> int:
+    # coordinate dimension of an empty array, 2 when its shape does not say
+    return coords.shape[-1] if coords.ndim > 1 and coords.shape[-1] in (2, 3) else 2
+
+class EdgeBuffer(object):
+    '''Edges as one contiguous (N, 2, D) float64 array with optional ids.'''
+    __slots__ = ('coords', 'ids')
+
+    def __init__(self, coords, ids=None):
+        coords = np.ascontiguousarray(coords, dtype=np.float64)
+        if coords.ndim != 3 or coords.shape[1] != 2:
+            raise ValueError(f"edges must have shape (N, 2, D), not {coords.shape}")
+        if ids is not None:
+            ids = np.asarray(ids)
+            if ids.shape != (len(coords),):
+                raise ValueError(f"expected {len(coords)} ids, got shape {ids.shape}")
+        self.coords = coords
+        self.ids = ids
+
+    @classmethod
+    def from_edges(cls, edges, ids=None):
+        '''From polygon_to_edges / path_to_edges style lists of coordinate pairs'''
+        coords = np.asarray(edges, dtype=np.float64)
+        if coords.size == 0:
+            return cls(np.empty((0, 2, _dim(coords))), ids)
+        return cls(coords.reshape(len(edges), 2, -1), ids)
+
+    @classmethod
+    def from_path(cls, path):
+        '''Consecutive vertices of a path, like path_to_edges'''
+        path = np.asarray(path, dtype=np.float64)
+        if path.size == 0:
+            return cls(np.empty((0, 2, _dim(path))))
+        return cls(np.stack((path[:-1], path[1:]), axis=1))
+
+    @classmethod
+    def from_polygons(cls, polygons, include_z: bool = False):
+        '''Exterior edges of many polygons; ids are the polygon indices'''
+        return cls(*polygons_to_edges(polygons, include_z))
+
+    @classmethod
+    def from_shapely(cls, lines, include_z: bool = False):
+        '''Every segment of a LineString array; ids are the line indices'''
+        coords, index = shapely.get_coordinates(lines, include_z=include_z, return_index=True)
+        same = index[:-1] == index[1:]
+        return cls(np.stack((coords[:-1][same], coords[1:][same]), axis=1), index[:-1][same])
+
+    def to_shapely(self) -> np.ndarray:
+        return shapely.linestrings(self.coords)
+
+    def to_polygons(self) -> np.ndarray:
+        '''edges_to_polygons grouped by id (all edges form one group without ids)'''
+        return edges_to_polygons(self.coords, self.ids)
+
+    def to_faces(self, tolerance: float|None = None) -> tuple:
+        '''Every face of the whole buffer, with dangles, cuts and the edge-face pairs; see edges_to_faces'''
+        return edges_to_faces(self.coords, tolerance)
+
+    def to_list(self) -> list:
+        '''Python lists of coordinate tuples, like polygon_to_edges'''
+        return [list(map(tuple, edge)) for edge in self.coords.tolist()]
+
+    def lengths(self) -> np.ndarray:
+        return edge_lengths(self.coords)
+
+    @property
+    def dim(self) -> int:
+        return self.coords.shape[2]
+
+    def __len__(self):
+        return len(self.coords)
+
+    def __getitem__(self, key):
+        # slices are views of the same buffer; masks and index arrays copy
+        if isinstance(key, (int, np.integer)):
+            return self.coords[key]
+        return EdgeBuffer(self.coords[key], None if self.ids is None else self.ids[key])
+
+    def __repr__(self):
+        return f"EdgeBuffer({len(self)} edges, dim={self.dim}, ids={self.ids is not None})"
+
+    def save(self, path):
+        '''Writes coords.npy (and ids.npy) into the directory path'''
+        path = Path(path)
+        path.mkdir(parents=True, exist_ok=True)
+        np.save(path / 'coords.npy', self.coords)
+        if self.ids is not None:
+            np.save(path / 'ids.npy', self.ids)
+        elif (path / 'ids.npy').exists():
+            (path / 'ids.npy').unlink()
+
+    @classmethod
+    def load(cls, path, mmap: bool = True):
+        '''Reads a saved buffer; with mmap the arrays stay on disk until touched'''
+        path = Path(path)
+        mode = 'r' if mmap else None
+        ids = np.load(path / 'ids.npy', mmap_mode=mode) if (path / 'ids.npy').exists() else None
+        return cls(np.load(path / 'coords.npy', mmap_mode=mode), ids)
+
+
+if __name__ == "__main__":
+    from shapely import Polygon
+    from playground import polygon_to_edges
+
+    poly = Polygon([[0, 0], [1, 0], [1, 1], [0, 0]])
+    edges = EdgeBuffer.from_edges(polygon_to_edges(poly))
+    print(edges, edges.lengths())
+    print(f"Polygon from edges: {edges.to_polygons()[0]}")
@@ -0,0 +1,216 @@
+"""Benchmarks for the playground geometry helpers.
+
+Run from the repository root:
+
+    python -m extra.benchmarks                         # run everything
+    python -m extra.benchmarks -k tangent --quick      # subset, smallest sizes
+    python -m extra.benchmarks --save-baseline         # store the current numbers
+    python -m extra.benchmarks --baseline              # compare against them
+
+Every case is timed with timeit (best of --repeat runs) for each input size.
+Results are written as JSON; when comparing against a baseline, cases slower
+than the baseline by more than --threshold are reported and the run exits 1.
+"""
+import argparse
+import json
+import platform
+import sys
+import timeit
+from pathlib import Path
+
+import numpy as np
+import shapely
+
+import playground
+from extra import tangent
+from extra.geometry import Circle
+
+BASELINE = Path(__file__).with_name('benchmark_baseline.json')
+
+CASES = {}
+
+def benchmark(*sizes):
+    '''Registers a case; the function takes a size and returns the callable to time'''
+    def register(func):
+        CASES[func.__name__.removeprefix('bench_')] = (func, sizes)
+        return func
+    return register
+
+
+# input generators
+
+def random_points(n, seed=0):
+    rng = np.random.default_rng(seed)
+    return [tuple(p) for p in rng.random((n, 2)) * 100]
+
+def grid_diagonals(side, seed=0):
+    # jittered side x side grid where both diagonals of every cell are
+    # candidate segments: one crossing per cell, so the output grows with n
+    rng = np.random.default_rng(seed)
+    ij = np.stack(np.meshgrid(np.arange(side), np.arange(side), indexing='ij'), axis=-1).reshape(-1, 2)
+    points = [tuple(p) for p in ij + rng.uniform(-0.2, 0.2, ij.shape)]
+    idx = np.arange(side * side).reshape(side, side)
+    segments = np.concatenate([
+        np.column_stack((idx[:-1, :-1].ravel(), idx[1:, 1:].ravel())),
+        np.column_stack((idx[1:, :-1].ravel(), idx[:-1, 1:].ravel())),
+    ])
+    return points, segments
+
+def lines_and_polygons(n_lines, n_polygons, seed=0):
+    # short random segments over small octagon-ish obstacles in a square map
+    rng = np.random.default_rng(seed)
+    size = 10 * np.sqrt(n_polygons)
+    centers = shapely.points(rng.uniform(0, size, (n_polygons, 2)))
+    polygons = shapely.buffer(centers, 1, quad_segs=2)
+    starts = rng.uniform(0, size, (n_lines, 2))
+    ends = starts + rng.uniform(-5, 5, (n_lines, 2))
+    return shapely.linestrings(np.stack((starts, ends), axis=1)), polygons
+
+def random_polygons(n, seed=0):
+    rng = np.random.default_rng(seed)
+    return list(shapely.buffer(shapely.points(rng.uniform(0, 1000, (n, 2))), rng.uniform(1, 10, n), quad_segs=4))
+
+def random_circles(n, seed=0):
+    rng = np.random.default_rng(seed)
+    return rng.uniform(-1000, 1000, (n, 2)), rng.uniform(1, 10, n)
+
+
+# cases
+
+@benchmark(10, 20, 40)
+def bench_points_to_intersections(n):
+    points = random_points(n)
+    return lambda: playground.points_to_intersections(points)
+
+@benchmark(32, 100, 200)
+def bench_points_to_intersections_grid(side):
+    points, segments = grid_diagonals(side)
+    return lambda: playground.points_to_intersections(points, segments=segments)
+
+@benchmark(10, 100, 1_000)
+def bench_inside_ellipse(n):
+    # every point misses, so the full midpoint stream is consumed
+    rng = np.random.default_rng(0)
+    ps = list(shapely.points(rng.uniform(10, 20, (n, 3))))
+    sam = shapely.Polygon([(0, 0), (2, 0), (2, 1), (0, 1)])
+    return lambda: playground.inside_ellipse(ps, sam)
+
+@benchmark(10, 100, 1_000)
+def bench_inside_sphere(n):
+    rng = np.random.default_rng(0)
+    ps = list(shapely.points(rng.uniform(10, 20, (n, 3))))
+    center = shapely.Point(0, 0, 0)
+    return lambda: playground.inside_sphere(ps, center, 1.0)
+
+@benchmark(1_000, 10_000, 100_000)
+def bench_remove_lines_through_polygons(n):
+    lines, polygons = lines_and_polygons(n, n // 10)
+    return lambda: playground.remove_lines_through_polygons(lines, polygons)
+
+@benchmark(1_000, 10_000, 100_000)
+def bench_remove_lines_through_polygons_interior(n):
+    lines, polygons = lines_and_polygons(n, n // 10)
+    return lambda: playground.remove_lines_through_polygons(lines, polygons, 'interior')
+
+@benchmark(10, 100, 1_000)
+def bench_to_pentagon(n):
+    polygons = random_polygons(n)
+    return lambda: [playground.to_pentagon(p) for p in polygons]
+
+@benchmark(10, 100, 1_000)
+def bench_to_octogon(n):
+    polygons = random_polygons(n)
+    return lambda: [playground.to_octogon(p) for p in polygons]
+
+@benchmark(10, 100, 1_000)
+def bench_to_star(n):
+    polygons = random_polygons(n)
+    return lambda: [playground.to_star(p) for p in polygons]
+
+@benchmark(10, 1_000, 100_000)
+def bench_edges_to_polygon(n):
+    angles = np.linspace(0, 2 * np.pi, n, endpoint=False)
+    polygon = shapely.Polygon(np.column_stack((np.cos(angles), np.sin(angles))))
+    edges = playground.polygon_to_edges(polygon)
+    return lambda: playground.edges_to_polygon(edges)
+
+@benchmark(10, 100, 300)
+def bench_tangents(n):
+    # scalar reference: one tangents() call per circle pair
+    centers, radii = random_circles(n)
+    circles = [Circle(x, y, 0, r) for (x, y), r in zip(centers, radii)]
+    return lambda: [tangent.tangents(a, b) for i, a in enumerate(circles) for b in circles[i + 1:]]
+
+@benchmark(10, 100, 300)
+def bench_points_on_tangent(n):
+    centers, radii = random_circles(n)
+    circles = [Circle(x, y, 0, r) for (x, y), r in zip(centers, radii)]
+    return lambda: [tangent.points_on_tangent(a, b) for i, a in enumerate(circles) for b in circles[i + 1:]]
+
+@benchmark(10, 300, 3_000)
+def bench_batch_tangents(n):
+    centers, radii = random_circles(n)
+    return lambda: tangent.batch_tangents(centers, radii)
+
+
+# runner
+
+def run(names, quick=False, repeat=3):
+    results = {}
+    for name in names:
+        func, sizes = CASES[name]
+        for size in sizes[:1] if quick else sizes:
+            times = timeit.repeat(func(size), number=1, repeat=repeat)
+            key = f"{name}[{size}]"
+            results[key] = {'min': min(times), 'median': float(np.median(times))}
+            print(f"  {key:<50} {min(times):10.4f} s", flush=True)
+    return results
+
+def compare(results, baseline, threshold):
+    # (case, slowdown) for every case slower than its baseline by more than threshold
+    regressions = []
+    for key, result in results.items():
+        if key in baseline:
+            ratio = result['min'] / baseline[key]['min']
+            if ratio > 1 + threshold:
+                regressions.append((key, ratio))
+    return regressions
+
+def environment():
+    return {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'numpy': np.__version__,
+        'shapely': shapely.__version__,
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarks for the playground geometry helpers.")
+    parser.add_argument('-k', dest='filter', default='', help="only cases whose name contains this")
+    parser.add_argument('--quick', action='store_true', help="only the smallest size of each case")
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--output', type=Path, help="write the results as JSON")
+    parser.add_argument('--baseline', nargs='?', type=Path, const=BASELINE, help="compare against a stored baseline")
+    parser.add_argument('--save-baseline', nargs='?', type=Path, const=BASELINE, help="store the results as the baseline")
+    parser.add_argument('--threshold', type=float, default=0.25, help="allowed slowdown before flagging (0.25 = 25%%)")
+    args = parser.parse_args(argv)
+
+    names = [name for name in CASES if args.filter in name]
+    results = run(names, args.quick, args.repeat)
+    report = {'environment': environment(), 'results': results}
+    for path in (args.output, args.save_baseline):
+        if path is not None:
+            path.write_text(json.dumps(report, indent=2))
+
+    if args.baseline is not None:
+        regressions = compare(results, json.loads(args.baseline.read_text())['results'], args.threshold)
+        for key, ratio in regressions:
+            print(f"REGRESSION {key}: {ratio:.2f}x the baseline")
+        if regressions:
+            return 1
+        print(f"No regressions against {args.baseline}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
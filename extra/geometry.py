@@ -1,14 +1,36 @@
 from __future__ import annotations
+import functools
 import math
 from math import sqrt
 from numbers import Number
 from typing import List
 import numpy as np
+import shapely
 
 EPS = 1E-9;
+# default mesh resolutions: (azimuth, polar) for hemispheres, (z, theta) for cylinders
+SPHERE_RESOLUTION = (20, 10)
+CYLINDER_RESOLUTION = (50, 50)
+
+@functools.lru_cache(maxsize=32)
+def unit_hemisphere(n_u: int, n_v: int) -> np.ndarray:
+    # (3, n_u, n_v) upper unit hemisphere; cached, so it is returned read-only
+    u, v = np.mgrid[0:2*np.pi:n_u*1j, 0:np.pi/2:n_v*1j]
+    mesh = np.stack((np.cos(u)*np.sin(v), np.sin(u)*np.sin(v), np.cos(v)))
+    mesh.flags.writeable = False
+    return mesh
+
+@functools.lru_cache(maxsize=32)
+def unit_cylinder(n_z: int, n_theta: int) -> np.ndarray:
+    # (3, n_z, n_theta) unit cylinder from z=0 to z=1; cached, so it is returned read-only
+    theta_grid, z_grid = np.meshgrid(np.linspace(0, 2*np.pi, n_theta), np.linspace(0, 1, n_z))
+    mesh = np.stack((np.cos(theta_grid), np.sin(theta_grid), z_grid))
+    mesh.flags.writeable = False
+    return mesh
 
 class Point(object):
     '''Creates a point on a coordinate plane with values x and y.'''
+    __slots__ = ('X', 'Y', 'Z')
 
     def __init__(self, x, y=0, z=0):
         '''Defines x and y variables'''
@@ -57,6 +79,7 @@ class Point(object):
 
 class Circle(Point):
     '''Creates a circle on a coordinate plane with values x and y.'''
+    __slots__ = ('radius',)
 
     def __init__(self, x, y=0, z=0, r=1):
         '''Defines x, y, and radius variables'''
@@ -163,22 +186,22 @@ class Circle(Point):
     
 class Sphere(Circle):
     '''Creates a circle on a coordinate plane with values x and y.'''
+    __slots__ = ()
 
     def __init__(self, x, y=0, z=0, r=1):
         '''Defines x, y, and radius variables'''
-        super().__init__(x, y, r)
-        self.Z = z
+        super().__init__(x, y, z, r)
 
     def __iter__(self):
         return iter((self.X, self.Y, self.Z, self.radius))
 
-    def data_for_sphere(self):
+    def data_for_sphere(self, resolution: tuple[int, int]|None = None):
         center_x, center_y, center_z, radius = self
 
-        u, v = np.mgrid[0:2*np.pi:20j, 0:np.pi/2:10j]
-        x = radius*np.cos(u)*np.sin(v) + center_x
-        y = radius*np.sin(u)*np.sin(v) + center_y
-        z = radius*np.cos(v) + center_z
+        ux, uy, uz = unit_hemisphere(*(resolution or SPHERE_RESOLUTION))
+        x = radius*ux + center_x
+        y = radius*uy + center_y
+        z = radius*uz + center_z
         return x, y, z
     
     # If ALL points are inside sphere, return True
@@ -192,6 +215,7 @@ class Sphere(Circle):
         return True
 
 class Line(object):
+    __slots__ = ('a', 'b', 'c')
 
     def __init__(self, a, b, c):
         self.a = a
@@ -205,6 +229,8 @@ class Line(object):
         return f"{self.a}*x + {self.b}*y + {self.c} = 0"
 
 class Cylinder(Sphere):
+    __slots__ = ('height',)
+
     def __init__(self, x, y, z, r, h):
         '''Defines x, y, and radius variables'''
         super().__init__(x, y, z, r)
@@ -213,15 +239,138 @@ class Cylinder(Sphere):
     def __iter__(self):
         return iter((self.X, self.Y, self.Z, self.radius, self.height))
 
-    def data_for_cylinder_along_z(self, **kwargs):
+    def data_for_cylinder_along_z(self, resolution: tuple[int, int]|None = None, **kwargs):
         center_x, center_y, center_z, radius, height_z = self
-        z = np.linspace(center_z, height_z, 50)
-        theta = np.linspace(0, 2*np.pi, 50)
-        theta_grid, z_grid=np.meshgrid(theta, z)
-        x_grid = radius*np.cos(theta_grid) + center_x
-        y_grid = radius*np.sin(theta_grid) + center_y
+        ux, uy, uz = unit_cylinder(*(resolution or CYLINDER_RESOLUTION))
+        x_grid = radius*ux + center_x
+        y_grid = radius*uy + center_y
+        z_grid = (height_z - center_z)*uz + center_z
         return x_grid,y_grid,z_grid
 
+def data_for_cylinders_along_z(cylinders, resolution: tuple[int, int]|None = None,
+                               out: np.ndarray|None = None) -> np.ndarray:
+    '''Meshes of many cylinders (Cylinder objects or (K, 5) x, y, z, r, height rows) as one (K, 3, n_z, n_theta) array'''
+    if len(cylinders) and isinstance(cylinders[0], Cylinder):
+        cylinders = [tuple(c) for c in cylinders]
+    x, y, z, r, h = np.asarray(cylinders, dtype=float).reshape(-1, 5).T
+    unit = unit_cylinder(*(resolution or CYLINDER_RESOLUTION))
+    out = np.empty((len(x), *unit.shape)) if out is None else out
+    scale = np.column_stack((r, r, h - z))[:, :, None, None]
+    np.multiply(scale, unit, out=out)
+    out += np.column_stack((x, y, z))[:, :, None, None]
+    return out
+
+CIRCLE_DTYPE = np.dtype([('x', 'f8'), ('y', 'f8'), ('z', 'f8'), ('r', 'f8')])
+
+def _xyz(ps) -> np.ndarray:
+    # (N, 3) coordinates from Point objects, shapely geometries or a coordinate array
+    if len(ps) and isinstance(ps[0], Point):
+        return np.array([(p.X, p.Y, p.Z) for p in ps], dtype=float)
+    arr = np.asarray(ps)
+    if arr.dtype == object:
+        arr = np.nan_to_num(shapely.get_coordinates(arr, include_z=True), nan=0.0)
+    arr = arr.astype(float, copy=False).reshape(len(arr), -1)
+    if arr.shape[1] == 2:
+        arr = np.column_stack((arr, np.zeros(len(arr))))
+    return arr
+
+class CircleArray(object):
+    '''Columnar collection of circles backed by a NumPy structured array.'''
+    __slots__ = ('data',)
+    item = Circle
+
+    def __init__(self, x, y=0, z=0, r=1):
+        '''Defines x, y, z and radius columns; scalars are broadcast'''
+        x, y, z, r = np.broadcast_arrays(*(np.atleast_1d(np.asarray(v, dtype=float)) for v in (x, y, z, r)))
+        self.data = np.empty(len(x), dtype=CIRCLE_DTYPE)
+        self.data['x'], self.data['y'], self.data['z'], self.data['r'] = x, y, z, r
+
+    @classmethod
+    def from_data(cls, data: np.ndarray):
+        '''Wraps an existing CIRCLE_DTYPE array without copying'''
+        obj = cls.__new__(cls)
+        obj.data = data
+        return obj
+
+    @classmethod
+    def from_objects(cls, circles: list[Circle]):
+        return cls.from_data(np.array([(c.X, c.Y, c.Z, c.radius) for c in circles], dtype=CIRCLE_DTYPE))
+
+    @classmethod
+    def from_shapely(cls, geoms):
+        '''Minimum bounding circle of every geometry in a shapely array'''
+        geoms = np.asarray(geoms, dtype=object).reshape(-1)
+        centers = shapely.get_coordinates(shapely.centroid(shapely.minimum_bounding_circle(geoms)))
+        return cls(centers[:, 0], centers[:, 1], 0, shapely.minimum_bounding_radius(geoms))
+
+    def to_shapely(self, quad_segs: int = 16) -> np.ndarray:
+        '''Circles as a shapely polygon array'''
+        return shapely.buffer(self.centers(), self.radius, quad_segs=quad_segs)
+
+    def centers(self) -> np.ndarray:
+        return shapely.points(self.X, self.Y, self.Z)
+
+    @property
+    def X(self):
+        return self.data['x']
+
+    @property
+    def Y(self):
+        return self.data['y']
+
+    @property
+    def Z(self):
+        return self.data['z']
+
+    @property
+    def radius(self):
+        return self.data['r']
+
+    def __len__(self):
+        return len(self.data)
+
+    def __getitem__(self, key):
+        if isinstance(key, (int, np.integer)):
+            x, y, z, r = self.data[key].tolist()
+            return self.item(x, y, z, r)
+        # slices and masks keep the columnar layout (slices are views)
+        return self.from_data(self.data[key])
+
+    def __iter__(self):
+        return (self[i] for i in range(len(self)))
+
+    def distance(self, other: CircleArray|None = None) -> np.ndarray:
+        '''All-pairs 2D center distances, like Point.distance'''
+        other = self if other is None else other
+        return np.hypot(self.X[:, None] - other.X[None, :], self.Y[:, None] - other.Y[None, :])
+
+    def number_tangents_circle(self, other: CircleArray|None = None) -> np.ndarray:
+        '''All-pairs number of common tangents, like Circle.number_tangents_circle'''
+        other = self if other is None else other
+        distSq = (self.X[:, None] - other.X[None, :])**2 + (self.Y[:, None] - other.Y[None, :])**2
+        radSumSq = (self.radius[:, None] + other.radius[None, :])**2
+        return np.select([distSq == radSumSq, distSq > radSumSq], [3, 4], 2).astype(np.int8)
+
+class SphereArray(CircleArray):
+    '''Columnar collection of spheres backed by a NumPy structured array.'''
+    __slots__ = ()
+    item = Sphere
+
+    def data_for_sphere(self, resolution: tuple[int, int]|None = None, out: np.ndarray|None = None) -> np.ndarray:
+        '''Hemisphere meshes of all spheres as one (K, 3, n_u, n_v) array, written into out if given'''
+        unit = unit_hemisphere(*(resolution or SPHERE_RESOLUTION))
+        out = np.empty((len(self), *unit.shape)) if out is None else out
+        np.multiply(self.radius[:, None, None, None], unit, out=out)
+        out += np.column_stack((self.X, self.Y, self.Z))[:, :, None, None]
+        return out
+
+    # If ALL points are inside a sphere, its entry is True
+    def inside_sphere(self, ps) -> np.ndarray:
+        xyz = _xyz(ps)
+        centers = np.column_stack((self.X, self.Y, self.Z))
+        d = ((xyz[None, :, :] - centers[:, None, :])**2).sum(axis=-1)
+        return (d <= self.radius[:, None]**2).all(axis=1)
+
 if __name__ == "__main__":
 
     print (f"distance = {Point.testPoint()}" )
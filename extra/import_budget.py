@@ -0,0 +1,58 @@
+"""Import-time budget check for the library modules.
+
+Run from the repository root:
+
+    python -m extra.import_budget                  # playground, 300 ms budget
+    python -m extra.import_budget -m edges --budget 400
+
+Every module is imported in a fresh interpreter with python -X importtime.
+The check fails (exit 1) when the cumulative import time of a module, best
+of --repeat runs, exceeds the budget, or when it pulls in any of the
+heavyweight modules that must only be imported on first use.
+"""
+import argparse
+import subprocess
+import sys
+
+FORBIDDEN = ('matplotlib', 'networkx', 'shapely.plotting', 'scipy')
+
+def import_times(module: str) -> dict[str, int]:
+    '''Cumulative import time in microseconds of every module imported by `import module`'''
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                            capture_output=True, text=True, check=True)
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line.removeprefix('import time:').split('|')
+        times[name.strip()] = int(cumulative)
+    return times
+
+def check(module: str, budget_ms: float, repeat: int = 3) -> list[str]:
+    # problems found, empty when the module is within budget
+    runs = [import_times(module) for _ in range(repeat)]
+    problems = [f"{module} imports {name}" for name in FORBIDDEN
+                if any(n == name or n.startswith(name + '.') for n in runs[0])]
+    best = min(run[module] for run in runs) / 1000
+    print(f"  {module:<30} {best:8.1f} ms (budget {budget_ms:g} ms)")
+    if best > budget_ms:
+        problems.append(f"{module} took {best:.1f} ms to import, over the {budget_ms:g} ms budget")
+    return problems
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Import-time budget check for the library modules.")
+    parser.add_argument('-m', dest='modules', action='append', help="module to check (repeatable, default playground)")
+    parser.add_argument('--budget', type=float, default=300, help="allowed cumulative import time in ms")
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args(argv)
+
+    problems = []
+    for module in args.modules or ['playground']:
+        problems += check(module, args.budget, args.repeat)
+    for problem in problems:
+        print(f"OVER BUDGET {problem}")
+    return 1 if problems else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
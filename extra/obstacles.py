@@ -0,0 +1,193 @@
+"""Index over 3D sphere and cylinder obstacles.
+
+Spheres follow Sphere.inside_sphere: a point is inside when its squared
+distance to the center is at most radius**2. Cylinders stand along z like
+Cylinder.data_for_cylinder_along_z draws them, from Z up to height, and
+contain the points within radius of the axis in that z range.
+
+The broad phase is an STRtree over the xy footprints of the obstacles,
+rebuilt lazily after inserts and removals; the z ranges and the exact tests
+run vectorized in NumPy.
+"""
+import numpy as np
+import shapely
+try:
+    from geometry import Cylinder, Sphere, SphereArray, _xyz
+except ImportError: # imported from the repository root
+    from extra.geometry import Cylinder, Sphere, SphereArray, _xyz
+
+SPHERE, CYLINDER = 0, 1
+
+def _segments(segments) -> np.ndarray:
+    # (K, 2, 3) endpoints from an array of point pairs or two-point LineStrings
+    arr = np.asarray(segments)
+    if arr.dtype == object:
+        arr = np.nan_to_num(shapely.get_coordinates(arr, include_z=True), nan=0.0)
+    arr = arr.astype(float, copy=False).reshape(-1, 2, arr.shape[-1])
+    if arr.shape[2] == 2:
+        arr = np.concatenate((arr, np.zeros(arr.shape[:2] + (1,))), axis=2)
+    return arr
+
+class ObstacleIndex(object):
+    '''Spheres and z-aligned cylinders with insert/remove and batch containment and segment queries.
+
+    Obstacle ids are row numbers and stay stable across removals.
+    '''
+
+    def __init__(self, spheres=None, cylinders=None):
+        self._kind = np.empty(0, dtype=np.int8)
+        self._params = np.empty((0, 5)) # x, y, z, r, height (cylinders only)
+        self._alive = np.empty(0, dtype=bool)
+        self._tree = None
+        self._tree_ids = None
+        self._tree_bounds = None
+        if spheres is not None:
+            self.insert_spheres(spheres)
+        if cylinders is not None:
+            self.insert_cylinders(cylinders)
+
+    def __len__(self):
+        return int(self._alive.sum())
+
+    @property
+    def ids(self) -> np.ndarray:
+        return np.flatnonzero(self._alive)
+
+    def _insert(self, kind: int, params: np.ndarray) -> np.ndarray:
+        ids = np.arange(len(self._kind), len(self._kind) + len(params))
+        self._kind = np.concatenate((self._kind, np.full(len(params), kind, dtype=np.int8)))
+        self._params = np.concatenate((self._params, params))
+        self._alive = np.concatenate((self._alive, np.ones(len(params), dtype=bool)))
+        self._tree = None
+        return ids
+
+    def insert_spheres(self, spheres) -> np.ndarray:
+        '''Adds Sphere objects, a SphereArray or (K, 4) x, y, z, r rows; returns their ids'''
+        if isinstance(spheres, Sphere):
+            spheres = [spheres]
+        if isinstance(spheres, SphereArray):
+            rows = np.column_stack((spheres.X, spheres.Y, spheres.Z, spheres.radius))
+        elif len(spheres) and isinstance(spheres[0], Sphere):
+            rows = np.array([tuple(s)[:4] for s in spheres], dtype=float)
+        else:
+            rows = np.asarray(spheres, dtype=float).reshape(-1, 4)
+        return self._insert(SPHERE, np.column_stack((rows, np.zeros(len(rows)))))
+
+    def insert_cylinders(self, cylinders) -> np.ndarray:
+        '''Adds Cylinder objects or (K, 5) x, y, z, r, height rows; returns their ids'''
+        if isinstance(cylinders, Cylinder):
+            cylinders = [cylinders]
+        if len(cylinders) and isinstance(cylinders[0], Cylinder):
+            rows = np.array([tuple(c) for c in cylinders], dtype=float)
+        else:
+            rows = np.asarray(cylinders, dtype=float).reshape(-1, 5)
+        return self._insert(CYLINDER, rows)
+
+    def remove(self, ids):
+        self._alive[np.atleast_1d(np.asarray(ids, dtype=np.intp))] = False
+        self._tree = None
+
+    def bounds(self, ids: np.ndarray|None = None) -> np.ndarray:
+        '''(K, 6) xmin, ymin, zmin, xmax, ymax, zmax boxes of the obstacles'''
+        ids = self.ids if ids is None else ids
+        x, y, z, r, h = self._params[ids].T
+        sphere = self._kind[ids] == SPHERE
+        zlo = np.where(sphere, z - r, np.minimum(z, h))
+        zhi = np.where(sphere, z + r, np.maximum(z, h))
+        return np.column_stack((x - r, y - r, zlo, x + r, y + r, zhi))
+
+    def _index(self) -> tuple[shapely.STRtree, np.ndarray, np.ndarray]:
+        if self._tree is None:
+            self._tree_ids = self.ids
+            self._tree_bounds = self.bounds(self._tree_ids)
+            b = self._tree_bounds
+            self._tree = shapely.STRtree(shapely.box(b[:, 0], b[:, 1], b[:, 3], b[:, 4]))
+        return self._tree, self._tree_ids, self._tree_bounds
+
+    def contains(self, ps) -> tuple[np.ndarray, np.ndarray]:
+        '''(point index, obstacle id) pairs for every obstacle containing one of the points'''
+        xyz = _xyz(ps)
+        tree, ids, bounds = self._index()
+        if len(xyz) == 0 or len(ids) == 0:
+            return np.empty(0, dtype=np.intp), np.empty(0, dtype=np.intp)
+        p, k = tree.query(shapely.points(xyz[:, :2]), predicate='intersects')
+        keep = (bounds[k, 2] <= xyz[p, 2]) & (xyz[p, 2] <= bounds[k, 5])
+        p, k = p[keep], ids[k[keep]]
+
+        x, y, z, r, _ = self._params[k].T
+        d2 = (xyz[p, 0] - x)**2 + (xyz[p, 1] - y)**2
+        # the z range of cylinders was checked with the boxes
+        d2 = np.where(self._kind[k] == SPHERE, d2 + (xyz[p, 2] - z)**2, d2)
+        inside = d2 <= r**2
+        return p[inside], k[inside]
+
+    def contains_any(self, ps) -> np.ndarray:
+        '''Per point, whether any obstacle contains it'''
+        xyz = _xyz(ps)
+        hit = np.zeros(len(xyz), dtype=bool)
+        hit[self.contains(xyz)[0]] = True
+        return hit
+
+    def inside_all(self, ps) -> np.ndarray:
+        '''Per live obstacle (in ids order), whether it contains ALL the points, like inside_sphere'''
+        xyz = _xyz(ps)
+        ids = self.ids
+        p, k = self.contains(xyz)
+        counts = np.zeros(len(self._kind), dtype=np.intp)
+        np.add.at(counts, k, 1)
+        return counts[ids] == len(xyz)
+
+    def segment_hits(self, segments) -> tuple[np.ndarray, np.ndarray]:
+        '''(segment index, obstacle id) pairs for every obstacle a segment passes through or touches'''
+        seg = _segments(segments)
+        tree, ids, bounds = self._index()
+        if len(seg) == 0 or len(ids) == 0:
+            return np.empty(0, dtype=np.intp), np.empty(0, dtype=np.intp)
+        s, k = tree.query(shapely.linestrings(seg[:, :, :2]), predicate='intersects')
+        zlo, zhi = seg[s, :, 2].min(axis=1), seg[s, :, 2].max(axis=1)
+        keep = (bounds[k, 2] <= zhi) & (zlo <= bounds[k, 5])
+        s, k = s[keep], ids[k[keep]]
+
+        a, b = seg[s, 0], seg[s, 1]
+        x, y, z, r, h = self._params[k].T
+        sphere = self._kind[k] == SPHERE
+        # parameter range of each segment inside the z slab (all of [0, 1] for spheres)
+        t0, t1 = np.zeros(len(s)), np.ones(len(s))
+        dz = b[:, 2] - a[:, 2]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            ta = (np.minimum(z, h) - a[:, 2]) / dz
+            tb = (np.maximum(z, h) - a[:, 2]) / dz
+        flat = (dz == 0) | sphere
+        t0 = np.where(flat, t0, np.maximum(t0, np.minimum(ta, tb)))
+        t1 = np.where(flat, t1, np.minimum(t1, np.maximum(ta, tb)))
+
+        # closest point to the center (spheres) or axis (cylinders) within [t0, t1]
+        d = b - a
+        w = a - np.column_stack((x, y, z))
+        d = np.where(sphere[:, None], d, d * [1, 1, 0])
+        w = np.where(sphere[:, None], w, w * [1, 1, 0])
+        dd = (d * d).sum(axis=1)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            t = -(w * d).sum(axis=1) / dd
+        t = np.clip(np.nan_to_num(t, nan=0.0), t0, t1)
+        closest = w + t[:, None] * d
+        hit = (t0 <= t1) & ((closest * closest).sum(axis=1) <= r**2)
+        return s[hit], k[hit]
+
+    def segments_blocked(self, segments) -> np.ndarray:
+        '''Per segment, whether it passes through any obstacle'''
+        seg = _segments(segments)
+        blocked = np.zeros(len(seg), dtype=bool)
+        blocked[self.segment_hits(seg)[0]] = True
+        return blocked
+
+
+if __name__ == "__main__":
+    from geometry import Point
+
+    index = ObstacleIndex([Sphere(0, 0, 0, 1), Sphere(5, 0, 0, 2)], [Cylinder(0, 5, 0, 1, 10)])
+    print("Containing obstacles:", index.contains([Point(0.5, 0.5, 0.5), Point(0, 5, 8), Point(3, 3, 3)]))
+    print("All inside:", index.inside_all([Point(0.5, 0.5, 0.5)]))
+    print("Blocked:", index.segments_blocked([[(-2, 0, 0), (2, 0, 0)], [(-2, 3, 0), (2, 3, 0)], [(0, 3, 5), (0, 7, 5)]]))
+    index.remove(0)
+    print("Without sphere 0:", index.segments_blocked([[(-2, 0, 0), (2, 0, 0)]]))
@@ -1,7 +1,11 @@
 from math import sqrt
 from numbers import Number
-from geometry import Line, Circle, Point, EPS
-from typing import List
+from typing import Iterator, List
+import numpy as np
+try:
+    from geometry import Line, Circle, Point, EPS
+except ImportError: # imported from the repository root
+    from extra.geometry import Line, Circle, Point, EPS
 
 '''
     tangent_circle: finds points on circle where a tangent line through (Px,Py) touches the circle
@@ -116,6 +120,69 @@ def points_on_tangent(a: Circle, b: Circle) -> list:
         # dydx * y1- b*dydx = x1 -a
         # y1 = (x1 - a)/dydx + b
     return points
+
+# sign of (r1, r2) for the four tangent slots, in the order tangents() tries them
+_SIGNS = np.array([(-1, -1), (-1, 1), (1, -1), (1, 1)], dtype=float)
+
+'''
+    batch_tangent_lines: vectorized tangents() for arrays of circle pairs.
+    Returns (K, 4, 3) line coefficients (a, b, c) of a*x + b*y + c = 0 and
+    (K, 4, 2, 2) tangent points (slot, circle a/b, xy). Slots without a tangent are NaN.
+'''
+def batch_tangent_lines(ca: np.ndarray, ra: np.ndarray, cb: np.ndarray, rb: np.ndarray):
+    ca, cb = np.asarray(ca, dtype=float)[:, :2], np.asarray(cb, dtype=float)[:, :2]
+    ra, rb = np.asarray(ra, dtype=float), np.asarray(rb, dtype=float)
+    dx, dy = (cb[:, 0] - ca[:, 0])[:, None], (cb[:, 1] - ca[:, 1])[:, None]
+    r1 = ra[:, None] * _SIGNS[:, 0]
+    r = rb[:, None] * _SIGNS[:, 1] - r1
+    z = dx*dx + dy*dy
+    with np.errstate(divide='ignore', invalid='ignore'):
+        d = z - r*r
+        valid = (d >= -EPS) & (z > 0)
+        d = np.sqrt(np.abs(d))
+        a = (dx * r + dy * d) / z
+        b = (dy * r - dx * d) / z
+    c = r1 - a * ca[:, :1] - b * ca[:, 1:]
+    lines = np.stack((a, b, c), axis=-1)
+    lines[~valid] = np.nan
+
+    # (a, b) is a unit normal, so projecting a center is a single step along it
+    points = np.empty(lines.shape[:2] + (2, 2))
+    for k, center in enumerate((ca, cb)):
+        dist = a * center[:, :1] + b * center[:, 1:] + c
+        points[:, :, k, 0] = center[:, :1] - dist * a
+        points[:, :, k, 1] = center[:, 1:] - dist * b
+    points[~valid] = np.nan
+    return lines, points
+
+'''
+    iter_batch_tangents: tangents between many circles, chunked to bound memory.
+    centers is (N, 2|3) (e.g. CircleArray X/Y columns), radii is (N,); pairs is an
+    optional (K, 2) index array and defaults to every pair i < j.
+    Yields (pairs, lines, points) per chunk.
+'''
+def iter_batch_tangents(centers, radii, pairs=None, chunk_size: int = 100_000) -> Iterator[tuple]:
+    centers = np.asarray(centers, dtype=float)
+    radii = np.asarray(radii, dtype=float)
+    if pairs is None:
+        from parallel import pair_indices # repository root module, absent when run from extra/
+
+        chunks = pair_indices(len(centers), chunk_size)
+    else:
+        pairs = np.asarray(pairs, dtype=np.intp).reshape(-1, 2)
+        chunks = (pairs[k:k + chunk_size] for k in range(0, len(pairs), chunk_size))
+    for chunk in chunks:
+        i, j = chunk[:, 0], chunk[:, 1]
+        yield (chunk, *batch_tangent_lines(centers[i], radii[i], centers[j], radii[j]))
+
+'''
+    batch_tangents: iter_batch_tangents collected into (pairs, lines, points) arrays
+'''
+def batch_tangents(centers, radii, pairs=None, chunk_size: int = 100_000) -> tuple:
+    parts = list(iter_batch_tangents(centers, radii, pairs, chunk_size))
+    if not parts:
+        return np.empty((0, 2), dtype=np.intp), np.empty((0, 4, 3)), np.empty((0, 4, 2, 2))
+    return tuple(np.concatenate(p) for p in zip(*parts))
     
 if __name__ == "__main__":
     center_x, center_y = 0, 0
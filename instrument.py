@@ -0,0 +1,209 @@
+"""Opt-in instrumentation of the geometry helpers.
+
+Functions decorated with @instrument record, while instrumentation is
+enabled, their call count, input sizes, a wall-time histogram and how many
+times they called into shapely's vectorized API (the shapely.* functions
+and STRtree.query, i.e. the GEOS entry points). Disabled, a decorated
+function costs one flag check per call.
+
+    import instrument
+    with instrument.profiling():
+        playground.points_to_intersections(points)
+    print(instrument.to_prometheus())
+
+Only calls made in this process are seen; work shipped to a process pool
+(workers > 1) is timed as a whole but its shapely calls are not counted.
+"""
+from contextlib import contextmanager
+import functools
+import inspect
+import math
+import threading
+import time
+from typing import Callable
+
+import shapely
+
+# upper bounds (seconds) of the wall-time histogram buckets
+BUCKETS = (1e-5, 1e-4, 1e-3, 1e-2, 0.1, 1.0, 10.0, math.inf)
+
+_enabled = False
+_lock = threading.Lock()
+_local = threading.local() # per thread stack of shapely call counters
+_stats = {}
+_patched = {}
+
+class FunctionStats(object):
+    '''Accumulated measurements of one instrumented function.'''
+    __slots__ = ('calls', 'seconds', 'buckets', 'size_sum', 'size_max', 'shapely_calls')
+
+    def __init__(self):
+        self.calls = 0
+        self.seconds = 0.0
+        self.buckets = [0] * len(BUCKETS)
+        self.size_sum = 0
+        self.size_max = 0
+        self.shapely_calls = {}
+
+    def record(self, seconds: float, size: int, shapely_calls: dict):
+        self.calls += 1
+        self.seconds += seconds
+        self.buckets[next(i for i, bound in enumerate(BUCKETS) if seconds <= bound)] += 1
+        self.size_sum += size
+        self.size_max = max(self.size_max, size)
+        for name, count in shapely_calls.items():
+            self.shapely_calls[name] = self.shapely_calls.get(name, 0) + count
+
+    def to_dict(self) -> dict:
+        return {
+            'calls': self.calls,
+            'seconds': self.seconds,
+            'histogram': {str(bound): count for bound, count in zip(BUCKETS, self.buckets)},
+            'input_size_sum': self.size_sum,
+            'input_size_max': self.size_max,
+            'shapely_calls': dict(self.shapely_calls),
+        }
+
+def _default_size(*args, **kwargs) -> int:
+    # length of the first argument, 1 for scalars
+    try:
+        return len(args[0])
+    except (IndexError, TypeError):
+        return 1
+
+def instrument(func: Callable|None = None, *, name: str|None = None, size: Callable = _default_size):
+    '''Decorator recording calls of func while instrumentation is enabled.
+
+    size(*args, **kwargs) gives the input size of a call, by default the
+    length of the first argument.
+    '''
+    if func is None:
+        return functools.partial(instrument, name=name, size=size)
+    key = name or func.__qualname__
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if not _enabled:
+            return func(*args, **kwargs)
+        stack = _stack()
+        stack.append({})
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            seconds = time.perf_counter() - start
+            counts = stack.pop()
+            with _lock:
+                _stats.setdefault(key, FunctionStats()).record(seconds, size(*args, **kwargs), counts)
+    return wrapper
+
+def _stack() -> list:
+    stack = getattr(_local, 'stack', None)
+    if stack is None:
+        stack = _local.stack = []
+    return stack
+
+def _counting(name: str, func: Callable) -> Callable:
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        stack = getattr(_local, 'stack', None)
+        if stack:
+            # attributed to the innermost instrumented call
+            stack[-1][name] = stack[-1].get(name, 0) + 1
+        return func(*args, **kwargs)
+    return wrapper
+
+def _patch():
+    for name in dir(shapely):
+        func = getattr(shapely, name)
+        if not name.startswith('_') and inspect.isfunction(func) and func.__module__.startswith('shapely.'):
+            _patched[(shapely, name)] = func
+            setattr(shapely, name, _counting(name, func))
+    _patched[(shapely.STRtree, 'query')] = shapely.STRtree.query
+    shapely.STRtree.query = _counting('STRtree.query', shapely.STRtree.query)
+
+def _unpatch():
+    for (owner, name), func in _patched.items():
+        setattr(owner, name, func)
+    _patched.clear()
+
+def enable():
+    '''Starts recording; shapely calls are counted through wrappers installed until disable()'''
+    global _enabled
+    with _lock:
+        if not _enabled:
+            _patch()
+            _enabled = True
+
+def disable():
+    global _enabled
+    with _lock:
+        if _enabled:
+            _enabled = False
+            _unpatch()
+
+def enabled() -> bool:
+    return _enabled
+
+def reset():
+    with _lock:
+        _stats.clear()
+
+@contextmanager
+def profiling(reset_stats: bool = True):
+    '''Enables instrumentation for the duration of the block'''
+    was_enabled = _enabled
+    if reset_stats:
+        reset()
+    enable()
+    try:
+        yield _stats
+    finally:
+        if not was_enabled:
+            disable()
+
+def snapshot() -> dict:
+    with _lock:
+        return {key: stats.to_dict() for key, stats in _stats.items()}
+
+def to_json(**kwargs) -> str:
+    import json # off the playground import path
+
+    return json.dumps(snapshot(), **kwargs)
+
+def to_prometheus(prefix: str = 'geometry') -> str:
+    '''The recorded statistics in the Prometheus text exposition format'''
+    stats = snapshot()
+    lines = [
+        f"# HELP {prefix}_calls_total Calls of the instrumented function.",
+        f"# TYPE {prefix}_calls_total counter",
+    ]
+    lines += [f'{prefix}_calls_total{{function="{key}"}} {s["calls"]}' for key, s in stats.items()]
+
+    lines += [
+        f"# HELP {prefix}_call_seconds Wall time of the instrumented function.",
+        f"# TYPE {prefix}_call_seconds histogram",
+    ]
+    for key, s in stats.items():
+        cumulative = 0
+        for bound, count in s['histogram'].items():
+            cumulative += count
+            le = '+Inf' if bound == 'inf' else bound
+            lines.append(f'{prefix}_call_seconds_bucket{{function="{key}",le="{le}"}} {cumulative}')
+        lines.append(f'{prefix}_call_seconds_sum{{function="{key}"}} {s["seconds"]}')
+        lines.append(f'{prefix}_call_seconds_count{{function="{key}"}} {s["calls"]}')
+
+    lines += [
+        f"# HELP {prefix}_input_size_total Summed input sizes of the instrumented function.",
+        f"# TYPE {prefix}_input_size_total counter",
+    ]
+    lines += [f'{prefix}_input_size_total{{function="{key}"}} {s["input_size_sum"]}' for key, s in stats.items()]
+
+    lines += [
+        f"# HELP {prefix}_shapely_calls_total Calls into shapely's vectorized API.",
+        f"# TYPE {prefix}_shapely_calls_total counter",
+    ]
+    for key, s in stats.items():
+        lines += [f'{prefix}_shapely_calls_total{{function="{key}",call="{call}"}} {count}'
+                  for call, count in sorted(s['shapely_calls'].items())]
+    return '\n'.join(lines) + '\n'
@@ -1,20 +1,192 @@
-from matplotlib import pyplot as plt
-import geopandas as gpd
-from shapely.geometry import Polygon
-
-poly1 = Polygon([(0,0), (2,0), (2,2), (0,2)])
-poly2 = Polygon([(2,2), (4,2), (4,4), (2,4)])
-poly3 = Polygon([(1,1), (3,1), (3,3), (1,3)])
-poly4 = Polygon([(3,3), (5,3), (5,5), (3,5)])
-poly5 = Polygon([(7,7), (8,8), (9,9), (7,9)])
-polys = [poly1, poly2, poly3, poly4, poly5]     
-
-gpd.GeoSeries(polys).boundary.plot()
-plt.show()
-
-from shapely.ops import unary_union
-
-mergedPolys = unary_union(polys)
-print(list(mergedPolys.geoms) )
-gpd.GeoSeries([mergedPolys]).boundary.plot()
-plt.show()
\ No newline at end of file
+"""Merging overlapping polygons into connected components.
+
+merge_polygons streams polygons in chunks and spills them, as WKB record
+files in a temporary directory, into square grid tiles by their bounds
+center. It then sweeps the tile columns
+from left to right: each column's tiles are unioned (in a process pool with
+workers > 1) and stitched to the components still open from earlier
+columns. A component is yielded as soon as it ends left of every tile not
+yet swept, so nothing later can touch it.
+
+Only the tiles of the column batch being swept are read back, and a tile
+file is deleted once it is merged, so memory holds the current columns and
+the open components along the sweep front rather than the layer.
+"""
+from pathlib import Path
+import tempfile
+from typing import Iterable, Iterator
+
+import numpy as np
+import shapely
+
+from parallel import map_shards, resolve_workers
+from storage import load_wkb, read_wkb, write_wkb
+
+
+def read_geojsonseq(path, chunk_size: int = 100_000) -> Iterator[np.ndarray]:
+    # newline-delimited GeoJSON geometries or Features (RFC 8142 record separators allowed)
+    with open(path) as f:
+        chunk = []
+        for line in f:
+            line = line.strip().lstrip('\x1e')
+            if line:
+                chunk.append(line)
+            if len(chunk) == chunk_size:
+                yield shapely.from_geojson(chunk)
+                chunk = []
+        if chunk:
+            yield shapely.from_geojson(chunk)
+
+def read_geoparquet(path, chunk_size: int = 100_000, column: str = 'geometry') -> Iterator[np.ndarray]:
+    # needs pyarrow; the geometry column holds WKB as GeoParquet specifies
+    try:
+        import pyarrow.parquet as pq
+    except ImportError as e:
+        raise ImportError("reading GeoParquet requires pyarrow") from e
+    for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_size, columns=[column]):
+        yield shapely.from_wkb(batch.column(0).to_numpy(zero_copy_only=False))
+
+def read_chunks(source, chunk_size: int = 100_000) -> Iterator[np.ndarray]:
+    '''Geometry array chunks from a .wkb, .geojsonl/.geojsons or .parquet file, or an iterable of geometries'''
+    if isinstance(source, (str, Path)):
+        suffix = Path(source).suffix.lower()
+        if suffix == '.wkb':
+            return read_wkb(source, chunk_size)
+        if suffix in ('.geojsonl', '.geojsons', '.geojsonseq', '.jsonl'):
+            return read_geojsonseq(source, chunk_size)
+        if suffix in ('.parquet', '.geoparquet'):
+            return read_geoparquet(source, chunk_size)
+        raise ValueError(f"unknown polygon file type: {source}")
+    return _batched(source, chunk_size)
+
+def _batched(geoms: Iterable, chunk_size: int) -> Iterator[np.ndarray]:
+    chunk = []
+    for geom in geoms:
+        chunk.append(geom)
+        if len(chunk) == chunk_size:
+            yield np.asarray(chunk, dtype=object)
+            chunk = []
+    if chunk:
+        yield np.asarray(chunk, dtype=object)
+
+def partition(chunks: Iterable[np.ndarray], tile_size: float, directory) -> tuple[dict[tuple, Path], dict[tuple, np.ndarray]]:
+    '''Spills polygons into one WKB record file per grid tile, keyed by the tile of their bounds center.
+
+    Returns the tile files in directory and, per tile, the bounds of
+    everything in it (which can reach past the tile itself).
+    '''
+    tiles, extents = {}, {}
+    for geoms in chunks:
+        bounds = shapely.bounds(geoms)
+        keys = np.floor((bounds[:, :2] + bounds[:, 2:]) / 2 / tile_size).astype(np.int64)
+        order = np.lexsort((keys[:, 1], keys[:, 0]))
+        keys, geoms, bounds = keys[order], geoms[order], bounds[order]
+        starts = np.flatnonzero(np.r_[True, (keys[1:] != keys[:-1]).any(axis=1)])
+        for start, stop in zip(starts, np.r_[starts[1:], len(keys)]):
+            key = tuple(keys[start].tolist())
+            path = tiles.setdefault(key, Path(directory) / f"{key[0]}_{key[1]}.wkb")
+            write_wkb(path, geoms[start:stop], append=True)
+            box = np.r_[bounds[start:stop, :2].min(axis=0), bounds[start:stop, 2:].max(axis=0)]
+            old = extents.get(key, box)
+            extents[key] = np.r_[np.minimum(old[:2], box[:2]), np.maximum(old[2:], box[2:])]
+    return tiles, extents
+
+def _union_tile(path) -> np.ndarray:
+    # runs in a worker: union one spilled tile and ship its parts back as WKB
+    return shapely.to_wkb(shapely.get_parts(shapely.union_all(load_wkb(path))))
+
+def _components(n: int, a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    # connected component label of each of n nodes given edges a-b
+    labels = np.arange(n)
+    while True:
+        low = np.minimum(labels[a], labels[b])
+        new = labels.copy()
+        np.minimum.at(new, a, low)
+        np.minimum.at(new, b, low)
+        new = new[new]
+        if np.array_equal(new, labels):
+            return labels
+        labels = new
+
+def _stitch(pieces: np.ndarray, source: np.ndarray) -> np.ndarray:
+    # merges the pieces that touch a piece of another source; pieces of one source are disjoint already
+    a, b = shapely.STRtree(pieces).query(pieces, predicate='intersects')
+    cross = source[a] != source[b]
+    labels = _components(len(pieces), a[cross], b[cross])
+    order = np.argsort(labels, kind='stable')
+    starts = np.flatnonzero(np.r_[True, labels[order][1:] != labels[order][:-1]])
+    merged = []
+    for group in np.split(order, starts[1:]):
+        if len(group) == 1:
+            merged.append(pieces[group])
+        else:
+            merged.append(shapely.get_parts(shapely.union_all(pieces[group])))
+    return np.concatenate(merged)
+
+def merge_polygons(source, tile_size: float, chunk_size: int = 100_000, workers: int|None = 1,
+                   tmpdir=None) -> Iterator:
+    '''Yields the merged polygons of unary_union(source) component by component.
+
+    The tiles are spilled into a temporary directory under tmpdir (the system
+    default if None), removed when the generator finishes or is closed.
+    '''
+    with tempfile.TemporaryDirectory(dir=tmpdir, prefix='merge_polys-') as directory:
+        yield from _sweep(*partition(read_chunks(source, chunk_size), tile_size, directory), workers)
+
+def _sweep(tiles: dict, extents: dict, workers: int|None) -> Iterator:
+    columns = {}
+    for key in sorted(tiles):
+        columns.setdefault(key[0], []).append(key)
+    columns = list(columns.values())
+    # smallest xmin of any tile in columns i.. ; nothing to the left of it can still grow
+    reach = np.minimum.accumulate([min(extents[k][0] for k in column) for column in columns][::-1])[::-1]
+    reach = np.r_[reach[1:], np.inf]
+
+    # columns are unioned a batch at a time so that a process pool gets enough tiles per call
+    batch_tiles = 1 if resolve_workers(workers) == 1 else 4 * resolve_workers(workers)
+    open_ = np.empty(0, dtype=object) # merged components the sweep may still extend
+    i = 0
+    while i < len(columns):
+        batch = [columns[i]]
+        while sum(map(len, batch)) < batch_tiles and i + len(batch) < len(columns):
+            batch.append(columns[i + len(batch)])
+        keys = [key for column in batch for key in column]
+        paths = [tiles.pop(key) for key in keys]
+        results = dict(zip(keys, map_shards(_union_tile, [(path,) for path in paths], workers)))
+        for path in paths:
+            path.unlink()
+
+        for column in batch:
+            parts = [shapely.from_wkb(results.pop(key)) for key in column]
+            pieces = np.concatenate([open_, *parts])
+            # every open component counts as one source, every tile as another
+            source = np.r_[np.full(len(open_), -1), np.repeat(np.arange(len(parts)), [len(p) for p in parts])]
+            merged = _stitch(pieces, source)
+            done = shapely.bounds(merged)[:, 2] < reach[i]
+            yield from merged[done]
+            open_ = merged[~done]
+            i += 1
+
+if __name__ == "__main__":
+    from matplotlib import pyplot as plt
+    import geopandas as gpd
+    from shapely.geometry import Polygon
+    from shapely.ops import unary_union
+
+    poly1 = Polygon([(0,0), (2,0), (2,2), (0,2)])
+    poly2 = Polygon([(2,2), (4,2), (4,4), (2,4)])
+    poly3 = Polygon([(1,1), (3,1), (3,3), (1,3)])
+    poly4 = Polygon([(3,3), (5,3), (5,5), (3,5)])
+    poly5 = Polygon([(7,7), (8,8), (9,9), (7,9)])
+    polys = [poly1, poly2, poly3, poly4, poly5]
+
+    gpd.GeoSeries(polys).boundary.plot()
+    plt.show()
+
+    mergedPolys = unary_union(polys)
+    print(list(mergedPolys.geoms) )
+    gpd.GeoSeries([mergedPolys]).boundary.plot()
+    plt.show()
+
+    # the same merge, streamed through 3x3 tiles
+    print(list(merge_polygons(polys, tile_size=3)))
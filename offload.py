@@ -0,0 +1,130 @@
+"""Asyncio wrappers that keep long geometry operations off the event loop.
+
+A GeometryOffloader runs calls in an executor: a thread pool by default,
+which is enough for most operations because shapely 2 releases the GIL
+inside GEOS, or a process pool for Python-heavy work. A semaphore caps how
+many calls run at once. Cancelling the awaiting task cancels the call if
+it has not started yet. Small edges_to_polygon requests arriving together
+are batched into one vectorized edges_to_polygons call.
+
+    async with GeometryOffloader(max_concurrency=4) as geo:
+        merged = await geo.union_all(polygons)
+        faces = await asyncio.gather(*(geo.edges_to_polygon(e) for e in edge_sets))
+"""
+import asyncio
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+import functools
+from typing import Callable
+
+import numpy as np
+import shapely
+
+import playground
+
+
+def _edge_array(edges) -> np.ndarray|None:
+    # edges as an (E, 2, D) float array, or None when they do not form one
+    try:
+        coords = np.asarray(edges, dtype=float)
+    except (TypeError, ValueError):
+        return None
+    if coords.ndim != 3 or len(coords) == 0 or coords.shape[1] != 2 or coords.shape[2] not in (2, 3):
+        return None
+    return coords
+
+class GeometryOffloader(object):
+    '''Runs geometry operations in an executor with a concurrency limit and request batching.'''
+
+    def __init__(self, executor: Executor|str = 'thread', workers: int|None = None, max_concurrency: int = 4,
+                 batch_size: int = 1024, batch_delay: float = 0.002):
+        '''executor is an Executor instance or 'thread' / 'process' to create one with workers workers'''
+        self._owned = isinstance(executor, str)
+        if executor == 'thread':
+            executor = ThreadPoolExecutor(workers)
+        elif executor == 'process':
+            executor = ProcessPoolExecutor(workers)
+        elif self._owned:
+            raise ValueError(f"executor must be an Executor, 'thread' or 'process', not {executor!r}")
+        self.executor = executor
+        self.batch_size = batch_size
+        self.batch_delay = batch_delay
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._pending = [] # (edges, future) waiting for the next batch
+        self._timer = None
+        self._batches = set()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def close(self):
+        '''Flushes pending batches and shuts down an executor created by this offloader'''
+        if self._pending:
+            self._flush()
+        if self._batches:
+            await asyncio.gather(*self._batches, return_exceptions=True)
+        if self._owned:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+
+    async def run(self, func: Callable, *args, **kwargs):
+        '''Awaits func(*args, **kwargs) run in the executor, at most max_concurrency at a time'''
+        async with self._semaphore:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self.executor, functools.partial(func, *args, **kwargs))
+
+    async def points_to_intersections(self, points: list, **kwargs) -> list:
+        return await self.run(playground.points_to_intersections, points, **kwargs)
+
+    async def union_all(self, geoms, **kwargs):
+        # the unary_union of merge_polys
+        return await self.run(shapely.union_all, geoms, **kwargs)
+
+    async def polygonize(self, lines):
+        return await self.run(shapely.polygonize, lines)
+
+    async def edges_to_polygon(self, edges):
+        '''edges_to_polygon, batched with the other requests made within batch_delay'''
+        coords = _edge_array(edges)
+        if coords is None:
+            # empty, ragged or longer than two-point edges go through edges_to_polygon on their own
+            return await self.run(playground.edges_to_polygon, edges)
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((coords, future))
+        if len(self._pending) >= self.batch_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.batch_delay, self._flush)
+        return await future
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch = [(edges, future) for edges, future in self._pending if not future.cancelled()]
+        self._pending = []
+        # edges of different dimensions cannot share one coordinate array
+        for dim in {edges.shape[2] for edges, _ in batch}:
+            task = asyncio.get_running_loop().create_task(self._run_batch([b for b in batch if b[0].shape[2] == dim]))
+            self._batches.add(task)
+            task.add_done_callback(self._batches.discard)
+
+    async def _run_batch(self, batch: list):
+        edges = np.concatenate([edges for edges, _ in batch])
+        index = np.repeat(np.arange(len(batch)), [len(edges) for edges, _ in batch])
+        try:
+            polygons = await self.run(playground.edges_to_polygons, edges, index)
+        except asyncio.CancelledError:
+            for _, future in batch:
+                future.cancel()
+            raise
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, future), polygon in zip(batch, polygons):
+            if not future.done():
+                future.set_result(polygon)
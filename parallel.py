@@ -0,0 +1,47 @@
+"""Process-pool execution for the pairwise geometry kernels.
+
+Work is split into contiguous shards, every shard runs in a worker process
+and the results come back in shard order, so the merged output does not
+depend on scheduling. Geometries cross the process boundary as WKB and
+coordinates as plain NumPy arrays, never as pickled shapely objects.
+"""
+import os
+from typing import Callable, Iterator
+
+import numpy as np
+import shapely
+
+
+def resolve_workers(workers: int|None) -> int:
+    # None means one worker per core
+    return max(1, workers or os.cpu_count() or 1)
+
+def shard_ranges(n: int, shards: int) -> list[tuple[int, int]]:
+    '''Splits range(n) into at most shards contiguous (start, stop) pieces'''
+    bounds = np.linspace(0, n, min(shards, n) + 1).astype(int) if n else [0]
+    return [(int(a), int(b)) for a, b in zip(bounds[:-1], bounds[1:])]
+
+def pair_indices(n: int, chunk_size: int = 100_000, start: int = 0, stop: int|None = None) -> Iterator[np.ndarray]:
+    '''All index pairs i < j of n items with i in range(start, stop), in (K, 2) blocks of about chunk_size pairs'''
+    stop = n - 1 if stop is None else min(stop, n - 1)
+    rows = max(1, chunk_size // max(n, 1))
+    for i in range(start, stop, rows):
+        # block of the upper triangle: rows i..i+rows against every later column
+        r, c = np.triu_indices(min(rows, stop - i), 1, m=n - i)
+        yield np.column_stack((r + i, c + i))
+
+def map_shards(func: Callable, args: list[tuple], workers: int|None = None) -> list:
+    '''Runs func(*a) for every a in args, in a process pool when workers > 1; results keep the order of args'''
+    workers = resolve_workers(workers)
+    if workers == 1 or len(args) <= 1:
+        return [func(*a) for a in args]
+    from concurrent.futures import ProcessPoolExecutor # only needed when actually sharding
+
+    with ProcessPoolExecutor(min(workers, len(args))) as pool:
+        return list(pool.map(func, *zip(*args)))
+
+def to_wire(geoms) -> np.ndarray:
+    return shapely.to_wkb(np.asarray(geoms, dtype=object))
+
+def from_wire(wkbs) -> np.ndarray:
+    return shapely.from_wkb(wkbs)
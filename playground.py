@@ -1,18 +1,19 @@
 import itertools
-import json
-from math import sqrt
-from typing import Union, overload
+import math
+from typing import TYPE_CHECKING, Iterator, Union, overload
 
-import matplotlib.pyplot as plt
-import networkx as nx
 import numpy as np
 import shapely
-from shapely import polygonize, wkt
-import shapely.affinity
 from shapely.geometry import LineString, Point, Polygon, mapping
-import shapely.plotting
 
-from extra.geometry import Sphere
+from instrument import instrument
+from parallel import from_wire, map_shards, pair_indices, resolve_workers, shard_ranges, to_wire
+from snapgrid import SnapGrid
+
+# matplotlib and networkx are imported where they are used, so that library
+# users (e.g. short-lived worker processes) do not pay for them at import time
+if TYPE_CHECKING:
+    from extra.geometry import Sphere
 
 
 def polygon_to_tuple_points(polygon: Polygon, zcoords=() ):
@@ -27,25 +28,94 @@ def polygon_to_tuple_points(polygon: Polygon, zcoords=() ):
 
 def point_to_tuple(point: Point|tuple):
     if isinstance(point, Point):
-        return tuple(point.coords)[0]
+        # the x/y/z properties skip building a CoordinateSequence
+        return (point.x, point.y, point.z) if point.has_z else (point.x, point.y)
     return point
 
-def points_to_intersections(points: list, rounder:int = 1, criterion=None):
-    inters = []
-    # G = nx.complete_graph(points)
-    # G.remove_edges_from(nx.selfloop_edges(G))
+def _intersection_coords(coords: np.ndarray, segments: np.ndarray, start: int, stop: int,
+                         rounder: int, chunk_size: int) -> np.ndarray:
+    # rounded intersections found by querying segments[start:stop], deduped in first-seen order
+    lines = shapely.linestrings(coords[segments])
+    tree = shapely.STRtree(lines)
+    include_z = coords.shape[1] > 2
+    found = []
+    for lo in range(start, stop, chunk_size):
+        first, second = tree.query(lines[lo:min(lo + chunk_size, stop)], predicate='intersects')
+        first += lo
+        pairs = first < second
+        first, second = first[pairs], second[pairs]
+        # segments sharing an endpoint meet at that endpoint, not a proper intersection
+        a, b = segments[first], segments[second]
+        disjoint = (a[:, :1] != b).all(axis=1) & (a[:, 1:] != b).all(axis=1)
+        first, second = first[disjoint], second[disjoint]
+        order = np.lexsort((second, first))
+        inter = shapely.intersection(lines[first[order]], lines[second[order]])
+        inter = inter[shapely.get_type_id(inter) == shapely.GeometryType.POINT]
+        rounded = np.round(shapely.get_coordinates(inter, include_z=include_z), rounder)
+        if len(rounded):
+            _, first_seen = np.unique(rounded, axis=0, return_index=True)
+            found.append(rounded[np.sort(first_seen)])
+    return np.concatenate(found) if found else np.empty((0, coords.shape[1]))
+
+@instrument
+def points_to_intersections(points: list, rounder:int = 1, criterion=None, segments=None,
+                            chunk_size: int = 50_000, workers: int|None = 1, grid: SnapGrid|None = None):
+    """
+    Finds the intersections of the segments spanned by the given points.
+
+    Args:
+      points: A list of Shapely Points or coordinate tuples.
+      rounder: Number of decimals the intersections are rounded (and deduplicated) to.
+      criterion: Optional callback criterion(point, inters) deciding whether a new
+        intersection is kept; inters is the list of Points kept so far, e.g.
+        snapgrid.min_distance(d).
+      segments: Optional (M, 2) array of point index pairs to use as candidate
+        segments. Defaults to every pair of points.
+      chunk_size: Number of segments queried against the index at once.
+      workers: Processes sharing the index queries (None for one per core).
+      grid: Optional SnapGrid to deduplicate against and fill, e.g. shared
+        across calls. Defaults to an empty grid of rounder decimals.
+
+    Returns:
+      A list of Shapely Points, one per distinct rounded intersection of two
+      segments that do not share an endpoint and not already in grid.
+    """
+    if len(points) < 4:
+        return []
+    coords = np.array([point_to_tuple(p) for p in points], dtype=float).reshape(len(points), -1)
+    if segments is None:
+        segments = np.column_stack(np.triu_indices(len(coords), 1))
+    segments = np.asarray(segments, dtype=np.intp).reshape(-1, 2)
+    # degenerate segments (a == b) never produce a proper intersection
+    segments = segments[np.any(coords[segments[:, 0]] != coords[segments[:, 1]], axis=1)]
+    if len(segments) < 2:
+        return []
+
+    # every shard builds the candidate segments and their index once and
+    # queries its own range of segments; shards come back in order
+    shards = shard_ranges(len(segments), resolve_workers(workers))
+    found = map_shards(_intersection_coords,
+                       [(coords, segments, a, b, rounder, chunk_size) for a, b in shards], workers)
+
+    found = np.concatenate(found)
+    if grid is None:
+        grid = SnapGrid(decimals=rounder)
     if criterion is None:
-        criterion = lambda a, b: True
-
-    for a, b, c, d in itertools.combinations(points, 4):
-        if a != b and c != d:
-            inter = LineString([a, b]).intersection(LineString([c, d]))
-            if isinstance(inter, Point):
-                rounded = Point(np.round(np.array(point_to_tuple(inter)), rounder).tolist())
-                if rounded not in inters and criterion(rounded, inters):
-                    inters.append(rounded)
+        # nothing inspects the grid while it grows, so insert and build the points in bulk
+        start = len(grid)
+        grid.extend(found)
+        return list(shapely.points(grid.coords[start:])) if len(grid) > start else []
+
+    inters = []
+    for xyz in found.tolist():
+        if xyz in grid:
+            continue
+        point = Point(xyz)
+        if criterion(point, inters):
+            grid.add(xyz)
+            inters.append(point)
     return inters
-   
+
 def polygon_to_edges(polygon: Polygon):
     b = polygon.boundary.coords
     linestrings = [LineString(b[k:k+2]) for k in range(len(b) - 1)]
@@ -56,127 +126,398 @@ def edge_length(edge: Union[tuple, LineString]):
         edge = LineString([edge[0], edge[1]])
     return edge.length
 
+def edge_lengths(edges) -> np.ndarray:
+    # edge_length for an (N, 2, D) array; planar, like LineString.length
+    edges = np.asarray(edges, dtype=float)
+    return np.hypot(edges[:, 1, 0] - edges[:, 0, 0], edges[:, 1, 1] - edges[:, 0, 1])
+
 def coords_to_area(coords: Union[tuple, list]):
     polygon = Polygon(coords)
     return polygon.area
 
+@instrument
 def edges_to_polygon(edges: Union[tuple, list]):
-    polyy2 = polygonize([LineString(e) for e in edges])
+    polyy2 = shapely.polygonize([LineString(e) for e in edges])
     # return first polygon in collection
     return shapely.get_geometry(polyy2, 0) 
 
 def polygon2D(obs: Polygon):
-    return Polygon([el[0:2] for el in polygon_to_tuple_points(obs)])
+    return polygons2D([obs])[0]
 
 def point2D(p: Point):
     return shapely.transform(p, lambda x: x) 
 
+# Array-in/array-out counterparts of the helpers above. Ragged results are a
+# flat coordinate array plus an (M + 1,) offsets array (polygon i owns
+# coords[offsets[i]:offsets[i + 1]]) or a per-row polygon index.
+
+def polygons_to_points(polygons, include_z: bool = False) -> tuple[np.ndarray, np.ndarray]:
+    # polygon_to_tuple_points for many polygons: exterior vertices without the closing one
+    polygons = np.asarray(polygons, dtype=object).reshape(-1)
+    coords, index = shapely.get_coordinates(shapely.get_exterior_ring(polygons),
+                                            include_z=include_z, return_index=True)
+    counts = np.bincount(index, minlength=len(polygons))
+    keep = np.ones(len(coords), dtype=bool)
+    keep[(np.cumsum(counts) - 1)[counts > 0]] = False
+    return coords[keep], np.r_[0, np.cumsum(np.maximum(counts - 1, 0))]
+
+def points_to_polygons(coords, offsets) -> np.ndarray:
+    # inverse of polygons_to_points; rings are closed automatically
+    counts = np.diff(offsets)
+    result = np.full(len(counts), Polygon(), dtype=object)
+    ok = counts > 0 # empty polygons have no vertices and stay empty
+    rings = shapely.linearrings(coords, indices=np.repeat(np.arange(ok.sum()), counts[ok]))
+    result[ok] = shapely.polygons(rings)
+    return result
+
+def polygons_to_edges(polygons, include_z: bool = False) -> tuple[np.ndarray, np.ndarray]:
+    # polygon_to_edges for many polygons: (E, 2, D) edge coordinates and the polygon of each edge
+    polygons = np.asarray(polygons, dtype=object).reshape(-1)
+    coords, index = shapely.get_coordinates(shapely.get_exterior_ring(polygons),
+                                            include_z=include_z, return_index=True)
+    same = index[:-1] == index[1:]
+    return np.stack((coords[:-1][same], coords[1:][same]), axis=1), index[:-1][same]
+
+def edges_to_polygons(edges, index=None) -> np.ndarray:
+    # edges_to_polygon for many edge sets: one polygonize reduction per size class
+    lines = shapely.linestrings(np.asarray(edges, dtype=float))
+    if index is None:
+        index = np.zeros(len(lines), dtype=np.intp)
+    index = np.asarray(index, dtype=np.intp)
+    counts = np.bincount(index)
+    lines = lines[np.argsort(index, kind='stable')]
+    starts = np.cumsum(counts) - counts
+    result = np.full(len(counts), None, dtype=object)
+    # groups are padded with None only up to the largest group of their power
+    # of two size class, so padding stays under 2x however uneven the sizes
+    classes = np.ceil(np.log2(np.maximum(counts, 1))).astype(int)
+    for size in np.unique(classes[counts > 0]):
+        groups = np.flatnonzero((classes == size) & (counts > 0))
+        sizes = counts[groups]
+        rows = np.repeat(np.arange(len(groups)), sizes)
+        slot = np.arange(len(rows)) - np.repeat(np.cumsum(sizes) - sizes, sizes)
+        grouped = np.full((len(groups), sizes.max()), None, dtype=object)
+        grouped[rows, slot] = lines[starts[groups][rows] + slot]
+        # first polygon of every collection, like edges_to_polygon
+        result[groups] = shapely.get_geometry(shapely.polygonize(grouped), 0)
+    return result
+
+def edges_to_faces(edges, tolerance: float|None = None) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Polygonizes one large edge set into every face it encloses.
+
+    The edges are noded once (split at every crossing) and polygonized in a
+    single polygonize_full call; no Python object is created per edge.
+
+    Args:
+      edges: An (E, 2, D) array of edge endpoints, polygon_to_edges style
+        lists, or an EdgeBuffer.
+      tolerance: Distance within which a noded piece counts as lying on an
+        edge or face boundary. Defaults to 1e-9 of the coordinate extent.
+
+    Returns:
+      faces, dangles, cuts, invalid: geometry arrays of the faces (Polygons),
+        dangling edges, cut edges and invalid rings (LineStrings).
+      edge_face: (K, 2) array of (edge, face) index pairs, one per face an
+        edge (or a piece of it) bounds; sorted by edge.
+    """
+    coords = np.asarray(getattr(edges, 'coords', edges), dtype=float)
+    if coords.size == 0:
+        empty = np.empty(0, dtype=object)
+        return empty, empty, empty, empty, np.empty((0, 2), dtype=np.intp)
+    coords = coords.reshape(len(coords), 2, -1)
+    lines = shapely.linestrings(coords)
+    pieces = shapely.get_parts(shapely.node(shapely.multilinestrings(lines)))
+    faces, cuts, dangles, invalid = (shapely.get_parts(g) for g in shapely.polygonize_full(pieces))
+
+    if tolerance is None:
+        extent = np.ptp(coords[:, :, :2].reshape(-1, 2), axis=0).max()
+        tolerance = 1e-9 * max(extent, 1.0)
+    # noding can move split points off the original edge by rounding, so the
+    # midpoint of every piece is matched to edges and face boundaries with a tolerance
+    middles = shapely.line_interpolate_point(pieces, 0.5, normalized=True)
+    pe, edge = shapely.STRtree(lines).query(middles, predicate='dwithin', distance=tolerance)
+    pf, face = shapely.STRtree(shapely.boundary(faces)).query(middles, predicate='dwithin', distance=tolerance)
+
+    # join (piece, edge) with (piece, face) on the piece
+    order = np.argsort(pf, kind='stable')
+    pf, face = pf[order], face[order]
+    counts = np.bincount(pf, minlength=len(pieces))
+    starts = np.cumsum(counts) - counts
+    repeat = counts[pe]
+    slot = np.arange(repeat.sum()) - np.repeat(np.cumsum(repeat) - repeat, repeat)
+    pairs = np.column_stack((np.repeat(edge, repeat), face[np.repeat(starts[pe], repeat) + slot]))
+    edge_face = np.unique(pairs, axis=0) if len(pairs) else np.empty((0, 2), dtype=np.intp)
+    return faces, dangles, cuts, invalid, edge_face
+
+def polygons2D(polygons) -> np.ndarray:
+    # polygon2D for many polygons: exterior ring only, z dropped
+    polygons = np.asarray(polygons, dtype=object).reshape(-1)
+    return shapely.polygons(shapely.force_2d(shapely.get_exterior_ring(polygons)))
+
+def coords_to_areas(coords, offsets) -> np.ndarray:
+    # coords_to_area for many rings given as polygons_to_points output
+    return shapely.area(points_to_polygons(coords, offsets))
 
-def distance_between(p1, p2):
-    np1 = np.array(point_to_tuple(p1))
-    np2 = np.array(point_to_tuple(p2))
-    return np.sqrt(np.sum((np1-np2)**2))
-
-def middle_points( ps: list[Point]):
-    middles = set()
-    for p, q in itertools.combinations(ps, 2):
-        middles.add( Point( (p.x+q.x)/2, (p.y+q.y)/2, (p.z+q.z)/2 if p.has_z and q.has_z else 0 ))
-    ps.extend( list(middles) )
 
-def inside_ellipse( ps: list[Point], sam: Polygon):
+def distance_between(p1, p2):
+    # a single pair is cheaper in plain floats than in NumPy
+    return math.dist(point_to_tuple(p1), point_to_tuple(p2))
+
+def distances(a, b) -> np.ndarray:
+    """
+    Row-wise distances between two equally long (or broadcastable) point sets.
+
+    Args:
+      a, b: Shapely Points, geometry arrays or (N, 2|3) coordinate arrays. A
+        missing z counts as 0.
+
+    Returns:
+      An (N,) float array.
+    """
+    diff = points_to_coords(a) - points_to_coords(b)
+    return np.sqrt(np.einsum('ij,ij->i', diff, diff))
+
+def iter_distance_matrix(a, b=None, chunk_size: int = 1_000_000) -> Iterator[tuple[int, np.ndarray]]:
+    """
+    Streams the distance matrix between two point sets in row blocks.
+
+    Args:
+      a: Shapely Points, a geometry array or an (N, 2|3) coordinate array.
+      b: The same for M points; defaults to a.
+      chunk_size: Approximate number of matrix entries per block.
+
+    Yields:
+      (start, block) pairs where block is the (K, M) slice of rows
+      start..start + K.
+    """
+    ca = points_to_coords(a)
+    cb = ca if b is None else points_to_coords(b)
+    rows = max(1, chunk_size // max(len(cb), 1))
+    for start in range(0, len(ca), rows):
+        block = ca[start:start + rows]
+        # one axis at a time, so the only temporaries are (K, M)
+        d2 = np.subtract.outer(block[:, 0], cb[:, 0])**2
+        for axis in (1, 2):
+            d2 += np.subtract.outer(block[:, axis], cb[:, axis])**2
+        yield start, np.sqrt(d2, out=d2)
+
+def distance_matrix(a, b=None, chunk_size: int = 1_000_000, out: np.ndarray|None = None) -> np.ndarray:
+    # (N, M) distances filled block by block, e.g. into an np.memmap given as out
+    ca = points_to_coords(a)
+    cb = ca if b is None else points_to_coords(b)
+    out = np.empty((len(ca), len(cb))) if out is None else out
+    for start, block in iter_distance_matrix(ca, cb, chunk_size):
+        out[start:start + len(block)] = block
+    return out
+
+def _point_coords(ps) -> np.ndarray:
+    # (N, 3) float array for Points, a geometry array or an (N, 2|3) coordinate array;
+    # a missing z is NaN
+    arr = np.asarray(ps)
+    if arr.size == 0:
+        return np.zeros((0, 3))
+    if arr.dtype == object:
+        return shapely.get_coordinates(arr, include_z=True)
+    coords = arr.astype(float, copy=False).reshape(len(arr), -1)
+    if coords.shape[1] == 2:
+        coords = np.column_stack((coords, np.full(len(coords), np.nan)))
+    return coords
+
+def points_to_coords(ps) -> np.ndarray:
+    # a missing z reads as 0, like p.z if p.has_z else 0
+    return np.nan_to_num(_point_coords(ps), nan=0.0)
+
+def iter_middle_points(ps, chunk_size: int = 100_000) -> Iterator[np.ndarray]:
+    """
+    Streams the midpoints of every pair of points without materializing them all.
+
+    Args:
+      ps: Shapely Points, a geometry array or an (N, 2|3) coordinate array.
+      chunk_size: Approximate number of midpoints per yielded chunk.
+
+    Yields:
+      (K, 3) coordinate arrays of midpoints; z is 0 unless both points have one.
+    """
+    coords = _point_coords(ps)
+    for pairs in pair_indices(len(coords), chunk_size):
+        yield np.nan_to_num((coords[pairs[:, 0]] + coords[pairs[:, 1]]) / 2, nan=0.0)
+
+def _unique_middle_points(coords: np.ndarray, start: int, stop: int, chunk_size: int = 100_000) -> np.ndarray:
+    # distinct midpoints of the pairs (i, j > i) for rows i in start..stop
+    found = [np.empty((0, 3))]
+    for pairs in pair_indices(len(coords), chunk_size, start, stop):
+        found.append(np.unique(np.nan_to_num((coords[pairs[:, 0]] + coords[pairs[:, 1]]) / 2, nan=0.0), axis=0))
+    return np.unique(np.concatenate(found), axis=0)
+
+def middle_points( ps: list[Point], workers: int|None = 1) -> list[Point]:
+    # returns ps followed by the distinct pairwise midpoints; ps is left untouched
+    coords = _point_coords(ps)
+    shards = shard_ranges(len(coords) - 1, resolve_workers(workers)) if len(coords) > 1 else []
+    found = map_shards(_unique_middle_points, [(coords, a, b) for a, b in shards], workers)
+    if not found:
+        return list(ps)
+    middles = np.unique(np.concatenate(found), axis=0)
+    return list(ps) + list(shapely.points(middles))
+
+def ellipse_params(sams) -> tuple[np.ndarray, np.ndarray]:
     # sam.bounds contains the width and height of the sam if desired to model ellipse
-    minx, miny, maxx, maxy = sam.bounds
-    radx, rady = (maxx - minx)/2, (maxy - miny)/2
-    center = shapely.centroid(sam)
+    bounds = shapely.bounds(np.asarray(sams, dtype=object)).reshape(-1, 4)
+    radx, rady = (bounds[:, 2] - bounds[:, 0])/2, (bounds[:, 3] - bounds[:, 1])/2
     # height = shapely.hausdorff_distance(sam, center)
-    height = max(radx, rady)
-    cx, cy, cz = center.x, center.y, center.z if center.has_z else 0
-
-    middle_points(ps) # extends ps
-    for p in ps:
-        x, y = p.x, p.y
-        z = p.z if p.has_z else 0
-        if (x - cx)**2/radx**2 \
-            + (y - cy)**2/rady**2 + (z - cz)**2/height**2 < 1:
-            return True
-    return False
+    height = np.maximum(radx, rady)
+    centers = points_to_coords(shapely.centroid(np.asarray(sams, dtype=object)).reshape(-1))
+    return centers, np.column_stack((radx, rady, height))
+
+def inside_ellipses(ps, sams) -> np.ndarray:
+    """
+    Tests many points against many ellipsoids at once.
+
+    Args:
+      ps: Shapely Points, a geometry array or an (N, 2|3) coordinate array.
+      sams: M Shapely Polygons, each modelled as the ellipsoid spanned by its bounds.
+
+    Returns:
+      An (N, M) boolean array, True where point n is strictly inside ellipsoid m.
+    """
+    coords = points_to_coords(ps)
+    centers, radii = ellipse_params(sams)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        d = (coords[:, None, :] - centers[None, :, :])**2 / radii[None, :, :]**2
+    return d.sum(axis=-1) < 1
+
+def inside_spheres(ps, centers, radii) -> np.ndarray:
+    """
+    Tests many points against many spheres at once.
+
+    Args:
+      ps: Shapely Points, a geometry array or an (N, 2|3) coordinate array.
+      centers: M sphere centers, as Points or an (M, 2|3) coordinate array.
+      radii: M sphere radii.
+
+    Returns:
+      An (N, M) boolean array, True where point n is strictly inside sphere m.
+    """
+    coords = points_to_coords(ps)
+    centers = points_to_coords(centers)
+    radii = np.asarray(radii, dtype=float).reshape(-1)
+    d = ((coords[:, None, :] - centers[None, :, :])**2).sum(axis=-1)
+    return d < radii[None, :]**2
+
+@instrument
+def inside_ellipse( ps: list[Point], sam: Polygon):
+    # the original points are checked before any midpoint is generated
+    coords = _point_coords(ps)
+    if inside_ellipses(coords, [sam]).any():
+        return True
+    return any(inside_ellipses(middles, [sam]).any() for middles in iter_middle_points(coords))
 
 @overload
-def inside_sphere(ps: list[Point], s: Sphere) -> bool: ...
+def inside_sphere(ps: list[Point], s: 'Sphere') -> bool: ...
 @overload
 def inside_sphere(ps: list[Point], center: Point, radius: float) -> bool: ...
 def inside_sphere(*args) -> bool:
     if len(args) == 3:
         ps, center, radius = args
-        cx, cy, cz, r = center.x, center.y, center.z if center.has_z else 0, radius
+        center, r = [center], radius
     else:
         ps, s = args
-        cx, cy, cz, r = s.X, s.Y, 0, s.radius
-
-    middle_points(ps)
-    for p in ps:
-        x, y = p.x, p.y
-        z = p.z if p.has_z else 0
-        if (x - cx)**2 + (y - cy)**2 + (z - cz)**2 < r**2:
-            return True
-    return False
+        center, r = [(s.X, s.Y, 0)], s.radius
+
+    coords = _point_coords(ps)
+    if inside_spheres(coords, center, [r]).any():
+        return True
+    return any(inside_spheres(middles, center, [r]).any() for middles in iter_middle_points(coords))
+
+def _radial_polygons(polygons, angles, factors) -> np.ndarray:
+    """
+    Builds one polygon per input from vertices placed around its bounds.
+
+    Args:
+      polygons: Shapely geometries (list or geometry array).
+      angles: Vertex angles in degrees, clockwise like GEOS overlay output.
+      factors: Vertex distances from the bounds center, as fractions of half
+        the bounds diagonal.
+
+    Returns:
+      A Shapely Polygon array; empty polygons where the bounds are degenerate.
+    """
+    bounds = shapely.bounds(np.asarray(polygons, dtype=object).reshape(-1))
+    center = (bounds[:, :2] + bounds[:, 2:]) / 2
+    radius = np.hypot(bounds[:, 2] - bounds[:, 0], bounds[:, 3] - bounds[:, 1]) / 2
+    angles = np.radians(angles)
+    unit = np.column_stack((np.cos(angles), np.sin(angles))) * np.asarray(factors, dtype=float)[:, None]
+    coords = center[:, None, :] + radius[:, None, None] * unit[None, :, :]
+    result = np.full(len(bounds), Polygon(), dtype=object)
+    ok = radius > 0 # buffering a point by 0 (or an empty input) gives an empty polygon
+    result[ok] = shapely.polygons(coords[ok])
+    return result
+
+# Every shape is the union of squares of half-width h around the bounds center,
+# with h such that the square corners lie on half the bounds diagonal. For k
+# squares rotated 90/k degrees apart the union is a star whose tips sit at
+# radius 1 (in half diagonals) and whose notches sit at cos(45)/cos(45 - 45/k).
+_STAR_NOTCH = np.cos(np.pi/4) / np.cos(np.pi/8)     # 2 squares
+_PENTAGON_NOTCH = np.cos(np.pi/4) / np.cos(np.pi/5) # 5 squares, 18 degrees apart
+
+def to_stars(polygons) -> np.ndarray:
+    # 8 pointed star: notches at 22.5 + 45k degrees, tips at 45k degrees
+    angles = 22.5 - 22.5 * np.arange(16)
+    return _radial_polygons(polygons, angles, np.tile([_STAR_NOTCH, 1.0], 8))
+
+def to_octogons(polygons, large: bool=True) -> np.ndarray:
+    # the star tips (large) or notches
+    if large:
+        return _radial_polygons(polygons, -45.0 * np.arange(8), np.ones(8))
+    return _radial_polygons(polygons, 22.5 - 45.0 * np.arange(8), np.full(8, _STAR_NOTCH))
+
+def to_pentagons(polygons, large: bool=True) -> np.ndarray:
+    # every fourth tip (large) or notch of the 5 square star
+    if large:
+        return _radial_polygons(polygons, -9.0 - 72.0 * np.arange(5), np.ones(5))
+    return _radial_polygons(polygons, -18.0 - 72.0 * np.arange(5), np.full(5, _PENTAGON_NOTCH))
 
 def to_star(polygon):
-    minx, miny, maxx, maxy = polygon.bounds
-    # get the centroid
-    centroid = [(maxx+minx)/2, (maxy+miny)/2]
-    # get the diagonal
-    diagonal = sqrt((maxx-minx)**2+(maxy-miny)**2)
-    square = Point(centroid).buffer(diagonal/sqrt(2.)/2., cap_style='square')
-    return square.union(shapely.affinity.rotate(square, 45))
+    return to_stars([polygon])[0]
 
 def to_octogon(polygon, large: bool=True):
-    minx, miny, maxx, maxy = polygon.bounds
-    # get the centroid
-    centroid = [(maxx+minx)/2, (maxy+miny)/2, 2]
-    # get the diagonal
-    diagonal = sqrt((maxx-minx)**2+(maxy-miny)**2)
-    octogon = Point(centroid).buffer(diagonal/sqrt(2.)/2., cap_style='square')
-    octogon = octogon.union(shapely.affinity.rotate(octogon, 45))
-    return Polygon([ p for i, p in enumerate(octogon.exterior.coords[:-1]) if i%2==int(large) ])
-
-# Could save computation by removing large
+    return to_octogons([polygon], large)[0]
+
 def to_pentagon(polygon, large: bool=True):
-    minx, miny, maxx, maxy = polygon.bounds
-    # get the centroid
-    centroid = [(maxx+minx)/2, (maxy+miny)/2]
-    # get the diagonal
-    diagonal = sqrt((maxx-minx)**2+(maxy-miny)**2)
-    pentagon = Point(centroid).buffer(diagonal/sqrt(2.)/2., cap_style='square')
-    for angle in range(36, 144, 36):
-        pentagon = pentagon.union(shapely.affinity.rotate(pentagon, angle))
-    # this is required for small errors in the above computation? shapely issue
-    pentagon = pentagon.simplify(tolerance=0.01) 
-    # for simple whole number polygons, i%8 == 1 is large, and 0 is smaller,
-    # but with simplify, it is random, so
-    if len(pentagon.exterior.coords[:-1]) > 8:
-        pZero = Polygon([ p for i, p in enumerate(pentagon.exterior.coords[:-1]) if i%8==0 ])
-        pOne = Polygon([ p for i, p in enumerate(pentagon.exterior.coords[:-1]) if i%8==1 ])
-        oneLarger = pOne.area > pZero.area
-        if oneLarger and large or not oneLarger and not large:
-            return pOne
-    else:
-        # There are not enough points for the above math to work, just return exterior
-        pZero = Polygon([p for p in pentagon.exterior.coords[:-1]])
-    return pZero
-
-def verify2DPolygonVisible(pin: Polygon, pout: Polygon|list) -> bool:
-    pin = polygon2D(pin)
-    if isinstance(pout, Polygon):
-        poly = polygon2D(pout)
-        return not poly.contains(pin)
-    for poly in pout:
-        poly = polygon2D(poly)
-        if poly.contains(pin):
-            return False
-    return True
+    return to_pentagons([polygon], large)[0]
+
+class OccluderSet(object):
+    '''Occluding polygons flattened to 2D, prepared and indexed once for repeated visibility queries.'''
+
+    def __init__(self, occluders: Polygon|list):
+        if isinstance(occluders, Polygon):
+            occluders = [occluders]
+        self.polygons = polygons2D(occluders)
+        shapely.prepare(self.polygons)
+        self.tree = shapely.STRtree(self.polygons)
+
+    def __len__(self):
+        return len(self.polygons)
+
+    def visible(self, pins: Polygon|list) -> bool|np.ndarray:
+        '''True for every pin that no occluder contains; a single pin gives a single bool.'''
+        single = isinstance(pins, Polygon)
+        pins = polygons2D(pins)
+        visible = np.ones(len(pins), dtype=bool)
+        # occluder.contains(pin) is pin.within(occluder)
+        hidden, _ = self.tree.query(pins, predicate='within')
+        visible[hidden] = False
+        return bool(visible[0]) if single else visible
+
+def verify2DPolygonVisible(pin: Polygon, pout: Polygon|list|OccluderSet) -> bool:
+    # build the OccluderSet once and pass it in when querying the same occluders repeatedly
+    if not isinstance(pout, OccluderSet):
+        pout = OccluderSet(pout)
+    return pout.visible(pin)
 
 def complete_graph_from_list(L, create_using=None):
+    import networkx as nx
+
     G = nx.empty_graph(L,create_using)
     if len(L)>1:
         if G.is_directed():
@@ -186,42 +527,209 @@ def complete_graph_from_list(L, create_using=None):
         G.add_edges_from(edges)
     return G
 
+def _knn_pairs(coords: np.ndarray, k: int, chunk_size: int) -> np.ndarray:
+    # k nearest neighbours of every point as (i, j) rows
+    try:
+        from scipy.spatial import cKDTree
+    except ImportError:
+        cKDTree = None
+    k = min(k, len(coords) - 1)
+    if cKDTree is not None:
+        _, nbrs = cKDTree(coords).query(coords, k + 1)
+        return np.column_stack((np.repeat(np.arange(len(coords)), k), nbrs[:, 1:].ravel()))
+    # STRtree radius search, doubling the radius for points with fewer than k hits
+    points = shapely.points(coords)
+    tree = shapely.STRtree(points)
+    extent = np.ptp(coords, axis=0)
+    area = np.prod(extent) or max(extent.max(), 1.0)**2
+    radius = 1.5 * np.sqrt(k * area / (np.pi * len(coords)))
+    todo, pairs = np.arange(len(coords)), []
+    while len(todo):
+        short = []
+        for start in range(0, len(todo), chunk_size):
+            rows = todo[start:start + chunk_size]
+            q, t = tree.query(points[rows], predicate='dwithin', distance=radius)
+            q = rows[q]
+            q, t = q[q != t], t[q != t]
+            counts = np.bincount(q, minlength=len(coords))[rows]
+            short.append(rows[counts < k])
+            full = counts[np.searchsorted(rows, q)] >= k
+            q, t = q[full], t[full]
+            order = np.lexsort((np.hypot(*(coords[t] - coords[q]).T), q))
+            q, t = q[order], t[order]
+            rank = np.arange(len(q)) - np.searchsorted(q, q)
+            pairs.append(np.column_stack((q, t))[rank < k])
+        todo = np.concatenate(short)
+        radius *= 2
+    return np.concatenate(pairs)
+
+def iter_sparse_edges(coords, k: int|None = None, radius: float|None = None, obstacles=None,
+                      chunk_size: int = 10_000) -> Iterator[tuple[np.ndarray, np.ndarray, np.ndarray]]:
+    """
+    Streams the edges of a sparse alternative to complete_graph_from_list.
+
+    Args:
+      coords: (N, 2|3) coordinate array, or Shapely Points.
+      k: Connect every point to its k nearest neighbours.
+      radius: Connect points at most radius apart (with k, also caps the kNN edges).
+      obstacles: Optional polygons; edges passing through their interior are dropped.
+      chunk_size: Number of points (or edges) handled at once.
+
+    Yields:
+      (u, v, weights) arrays of undirected edges u < v with their lengths.
+    """
+    coords = np.asarray(coords)
+    if coords.dtype == object:
+        coords = shapely.get_coordinates(coords)
+    coords = coords.astype(float, copy=False)
+    if k is None and radius is None:
+        raise ValueError("sparse graphs need k, radius or both")
+    if len(coords) < 2:
+        return
+
+    if k is not None:
+        pairs = _knn_pairs(coords[:, :2], k, chunk_size)
+        pairs = np.unique(np.sort(pairs, axis=1), axis=0)
+    else:
+        tree = shapely.STRtree(shapely.points(coords[:, :2]))
+        pairs = []
+        for start in range(0, len(coords), chunk_size):
+            i, j = tree.query(shapely.points(coords[start:start + chunk_size, :2]),
+                              predicate='dwithin', distance=radius)
+            i += start
+            pairs.append(np.column_stack((i, j))[i < j])
+        pairs = np.concatenate(pairs)
+
+    index = None if obstacles is None else polygon_index(obstacles, 'interior')
+    for start in range(0, len(pairs), chunk_size):
+        u, v = pairs[start:start + chunk_size].T
+        weights = edge_lengths(np.stack((coords[u], coords[v]), axis=1))
+        keep = np.ones(len(u), dtype=bool) if radius is None else weights <= radius
+        if index is not None:
+            lines = shapely.linestrings(np.stack((coords[u], coords[v]), axis=1)[keep])
+            keep[keep] = ~lines_through_polygons(lines, index, 'interior')
+        yield u[keep], v[keep], weights[keep]
+
+def sparse_graph_from_list(L, k: int|None = None, radius: float|None = None, obstacles=None, create_using=None):
+    # like complete_graph_from_list over coordinates, but only kNN / radius edges, weighted by length
+    import networkx as nx
+
+    nodes = [point_to_tuple(p) for p in L]
+    G = nx.empty_graph(nodes, create_using)
+    for u, v, w in iter_sparse_edges(nodes, k, radius, obstacles):
+        edges = [(nodes[a], nodes[b], c) for a, b, c in zip(u.tolist(), v.tolist(), w.tolist())]
+        G.add_weighted_edges_from(edges)
+        if G.is_directed():
+            G.add_weighted_edges_from((b, a, c) for a, b, c in edges)
+    return G
+
+def sparse_csr_from_coords(coords, k: int|None = None, radius: float|None = None, obstacles=None):
+    # (indptr, indices, data) adjacency over point indices, weights are edge lengths
+    parts = list(iter_sparse_edges(coords, k, radius, obstacles))
+    u, v, w = (np.concatenate(p) for p in zip(*parts)) if parts else (np.empty(0), np.empty(0), np.empty(0))
+    return edges_to_csr(u, v, w, len(coords))
+
+def edges_to_csr(u, v, weights, n: int, directed: bool = False):
+    # SciPy-style (indptr, indices, data) adjacency; undirected edges are stored both ways
+    u, v = np.asarray(u, dtype=np.intp), np.asarray(v, dtype=np.intp)
+    weights = np.asarray(weights, dtype=float)
+    if not directed:
+        u, v, weights = np.concatenate((u, v)), np.concatenate((v, u)), np.concatenate((weights, weights))
+    order = np.lexsort((v, u))
+    indptr = np.zeros(n + 1, dtype=np.intp)
+    np.cumsum(np.bincount(u, minlength=n), out=indptr[1:])
+    return indptr, v[order], weights[order]
+
 def path_to_edges(path):
     edges = []
     for i, el in enumerate(path):
         edges.append((el, path[(i + 1) % len(path)]))
     return edges[:-1]
 
-def remove_lines_through_polygons(lines, polygons):
+def polygon_index(polygons, mode: str = 'vertices') -> shapely.STRtree:
+  # index for lines_through_polygons, reusable across calls against the same polygons
+  polygons = np.asarray(polygons, dtype=object).reshape(-1)
+  if mode == 'vertices':
+    # one index over the distinct vertices instead of a Point per line x vertex
+    coords = shapely.get_coordinates(polygons)
+    return shapely.STRtree(shapely.points(np.unique(coords, axis=0)) if len(coords) else [])
+  if mode == 'interior':
+    shapely.prepare(polygons)
+    return shapely.STRtree(polygons)
+  raise ValueError(f"mode must be 'vertices' or 'interior', not {mode!r}")
+
+def _wire_lines_through_polygons(lines: np.ndarray, polygons: np.ndarray, mode: str) -> np.ndarray:
+  # runs in a worker: lines and polygons arrive as WKB, the mask goes back
+  return lines_through_polygons(from_wire(lines), from_wire(polygons), mode)
+
+def lines_through_polygons(lines, polygons, mode: str = 'vertices', workers: int|None = 1) -> np.ndarray:
+  """
+  Flags the lines that run into any of the given polygons.
+
+  Args:
+    lines: Shapely LineStrings (list or geometry array).
+    polygons: Shapely Polygons (list or geometry array), or the STRtree
+      polygon_index built for them with the same mode.
+    mode: 'vertices' flags lines touching any polygon vertex, holes included;
+      'interior' flags lines passing through the interior of any polygon.
+    workers: Processes sharing the lines (None for one per core); every
+      worker builds its own polygon index.
+
+  Returns:
+    A boolean array with one entry per line.
+  """
+  lines = np.asarray(lines, dtype=object).reshape(-1)
+  shards = shard_ranges(len(lines), resolve_workers(workers))
+  if len(shards) > 1:
+    if mode not in ('vertices', 'interior'):
+      raise ValueError(f"mode must be 'vertices' or 'interior', not {mode!r}")
+    if isinstance(polygons, shapely.STRtree):
+      # a vertices index holds the vertex points, which index to themselves
+      polygons = polygons.geometries
+    wire = to_wire(polygons)
+    masks = map_shards(_wire_lines_through_polygons,
+                       [(to_wire(lines[a:b]), wire, mode) for a, b in shards], workers)
+    return np.concatenate(masks)
+  tree = polygons if isinstance(polygons, shapely.STRtree) else polygon_index(polygons, mode)
+  blocked = np.zeros(len(lines), dtype=bool)
+  if len(lines) == 0 or len(tree) == 0:
+    return blocked
+
+  if mode == 'vertices':
+    hits, _ = tree.query(lines, predicate='intersects')
+    blocked[hits] = True
+  else:
+    # a line meets the interior of a polygon iff it crosses it or lies within it
+    for predicate in ('crosses', 'within'):
+      hits, _ = tree.query(lines, predicate=predicate)
+      blocked[hits] = True
+  return blocked
+
+@instrument
+def remove_lines_through_polygons(lines, polygons, mode: str = 'vertices', workers: int|None = 1):
   """
   Removes lines that intersect with any of the given polygons.
 
   Args:
     lines: A list of Shapely LineString objects.
     polygons: A list of Shapely Polygon objects.
+    mode: 'vertices' removes lines touching any polygon vertex (the original
+      behaviour); 'interior' removes lines passing through any polygon interior.
+    workers: Processes sharing the lines (None for one per core).
 
   Returns:
     A list of Shapely LineString objects that do not intersect with any of the
     given polygons.
   """
+  blocked = lines_through_polygons(lines, polygons, mode, workers)
+  return [line for line, b in zip(lines, blocked) if not b]
 
-  # Create a set of all the points that are contained within any of the polygons.
-  polygon_points = set()
-  for polygon in polygons:
-    polygon_points.update(polygon.exterior.coords)
-    for hole in polygon.interiors:
-      polygon_points.update(hole.coords)
-
-  # Filter the lines to only include those that do not intersect with any of the
-  # polygon points.
-  filtered_lines = []
-  for line in lines:
-    if not any(line.intersects(Point(point)) for point in polygon_points):
-      filtered_lines.append(line)
+if __name__ == '__main__':
+    import json
 
-  return filtered_lines
+    import matplotlib.pyplot as plt
+    from shapely import wkt
 
-if __name__ == '__main__':
     poly = Polygon([[14.471329,46.037286],[14.467378,46.036733],[14.468441,46.034822]])
     # poly_coordinates = mapping(poly)['coordinates'][0]
     # poly_ = [{'lat': coords[1],'lon': coords[0]} for coords in poly_coordinates]
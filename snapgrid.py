@@ -0,0 +1,133 @@
+"""Precision-grid index for deduplicating snapped points.
+
+A SnapGrid keys every point on its coordinates scaled by 10**decimals and
+rounded to integers, so inserting and membership tests are one dict lookup
+instead of a scan with shapely equality. Tolerance queries (points within d
+of a query point) hash the stored points into cells of size d on first use
+and only look at the 3**D neighbouring cells afterwards.
+"""
+import itertools
+import math
+from typing import Callable, Iterator
+
+import numpy as np
+import shapely
+from shapely.geometry import Point
+
+
+def _xyz(point) -> tuple:
+    # coordinate tuple of a shapely Point or a coordinate sequence
+    if isinstance(point, Point):
+        return point.coords[0]
+    return tuple(point)
+
+class SnapGrid(object):
+    '''Set of points snapped to a grid of 10**-decimals, in insertion order.'''
+    __slots__ = ('decimals', '_scale', '_keys', '_coords', '_points', '_cells')
+
+    def __init__(self, points=(), decimals: int = 1):
+        self.decimals = decimals
+        self._scale = 10.0 ** decimals
+        self._keys = {}   # snapped integer key -> row in _coords
+        self._coords = [] # snapped coordinate tuples
+        self._points = [] # Points for _coords, built lazily
+        self._cells = {}  # cell size -> {cell key: [rows]}
+        self.extend(points)
+
+    def __len__(self):
+        return len(self._coords)
+
+    def __iter__(self) -> Iterator[Point]:
+        if len(self._points) < len(self._coords):
+            self._points.extend(shapely.points(self.coords[len(self._points):]))
+        return iter(self._points)
+
+    def __contains__(self, point) -> bool:
+        return self.key(point) in self._keys
+
+    def key(self, point) -> tuple:
+        return tuple(round(c * self._scale) for c in _xyz(point))
+
+    def add(self, point) -> bool:
+        '''Inserts the snapped point; returns False when it was already present'''
+        key = self.key(point)
+        if key in self._keys:
+            return False
+        self._insert(key, tuple(k / self._scale for k in key))
+        return True
+
+    def extend(self, points):
+        '''Inserts many points given as Points or an (N, D) coordinate array'''
+        if isinstance(points, np.ndarray) and points.dtype != object:
+            coords = points.reshape(len(points), -1)
+        else:
+            coords = np.array([_xyz(p) for p in points], dtype=float)
+        if len(coords) == 0:
+            return
+        keys = np.rint(coords * self._scale).astype(np.int64)
+        _, first = np.unique(keys, axis=0, return_index=True)
+        keys = keys[np.sort(first)]
+        for key, xyz in zip(map(tuple, keys.tolist()), (keys / self._scale).tolist()):
+            if key not in self._keys:
+                self._insert(key, tuple(xyz))
+
+    def _insert(self, key: tuple, xyz: tuple):
+        row = len(self._coords)
+        self._keys[key] = row
+        self._coords.append(xyz)
+        for size, cells in self._cells.items():
+            cells.setdefault(tuple(math.floor(c / size) for c in xyz), []).append(row)
+
+    def _cells_of(self, size: float) -> dict:
+        # stored rows bucketed into cells of the given size, built once per size
+        cells = self._cells.get(size)
+        if cells is None:
+            cells = {}
+            for row, xyz in enumerate(self._coords):
+                cells.setdefault(tuple(math.floor(c / size) for c in xyz), []).append(row)
+            self._cells[size] = cells
+        return cells
+
+    def within(self, point, distance: float) -> list[int]:
+        '''Rows of the stored points at most distance away from point'''
+        if distance <= 0:
+            row = self._keys.get(self.key(point))
+            return [] if row is None else [row]
+        xyz = _xyz(point)
+        cells = self._cells_of(distance)
+        home = [math.floor(c / distance) for c in xyz]
+        rows = []
+        for offset in itertools.product((-1, 0, 1), repeat=len(home)):
+            for row in cells.get(tuple(h + o for h, o in zip(home, offset)), ()):
+                if math.dist(self._coords[row], xyz) <= distance:
+                    rows.append(row)
+        return rows
+
+    def nearest_within(self, point, distance: float) -> Point|None:
+        '''The stored point closest to point if it is at most distance away'''
+        rows = self.within(point, distance)
+        if not rows:
+            return None
+        xyz = _xyz(point)
+        return Point(min((self._coords[row] for row in rows), key=lambda c: math.dist(c, xyz)))
+
+    @property
+    def coords(self) -> np.ndarray:
+        return np.array(self._coords, dtype=float).reshape(len(self._coords), -1)
+
+    def to_points(self) -> np.ndarray:
+        return shapely.points(self.coords) if self._coords else np.empty(0, dtype=object)
+
+def min_distance(distance: float, decimals: int = 9) -> Callable:
+    '''points_to_intersections criterion keeping points farther than distance from every kept one'''
+    # kept only grows during a call, so the grid just indexes its new tail;
+    # a different list (the next call) starts a fresh grid
+    state = {'kept': None, 'indexed': 0, 'grid': None}
+
+    def criterion(point, kept: list) -> bool:
+        if kept is not state['kept']:
+            state.update(kept=kept, indexed=0, grid=SnapGrid(decimals=decimals))
+        state['grid'].extend(kept[state['indexed']:])
+        state['indexed'] = len(kept)
+        return not state['grid'].within(point, distance)
+    return criterion
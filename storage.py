@@ -0,0 +1,83 @@
+"""Binary persistence for geometry layers.
+
+save_layer writes a layer in the GeoArrow-style ragged layout of
+shapely.to_ragged_array: one directory holding the flat coordinate array,
+one offsets array per nesting level (ring, polygon, ...) as .npy files and
+a small layer.json describing them. load_layer memory-maps those arrays and
+hands them to shapely.from_ragged_array, so no text is parsed on the way in.
+
+Edge layers have their own flat format, see EdgeBuffer.save / load.
+read_wkb / write_wkb stream WKB records for exchange with other tools.
+"""
+import json
+from pathlib import Path
+import struct
+from typing import Iterator
+
+import numpy as np
+import shapely
+
+FORMAT_VERSION = 1
+
+def save_layer(path, geoms, include_z: bool|None = None):
+    '''Writes geometries of one type into the directory path; a mix with the Multi- type loads back as Multi-'''
+    path = Path(path)
+    path.mkdir(parents=True, exist_ok=True)
+    if len(geoms) == 0:
+        # to_ragged_array cannot type an empty layer; MISSING marks it on disk
+        geometry_type, coords, offsets = shapely.GeometryType.MISSING, np.empty((0, 3 if include_z else 2)), ()
+    else:
+        geometry_type, coords, offsets = shapely.to_ragged_array(np.asarray(geoms, dtype=object), include_z=include_z)
+    np.save(path / 'coords.npy', coords)
+    for level, offset in enumerate(offsets):
+        np.save(path / f'offsets{level}.npy', offset)
+    meta = {
+        'version': FORMAT_VERSION,
+        'geometry_type': shapely.GeometryType(geometry_type).name,
+        'count': len(geoms),
+        'dim': coords.shape[1],
+        'offsets': len(offsets),
+    }
+    (path / 'layer.json').write_text(json.dumps(meta))
+
+def load_layer_arrays(path, mmap: bool = True) -> tuple[shapely.GeometryType, np.ndarray, tuple]:
+    '''(geometry type, coords, offsets) of a saved layer; with mmap the arrays stay on disk until touched'''
+    path = Path(path)
+    meta = json.loads((path / 'layer.json').read_text())
+    if meta['version'] != FORMAT_VERSION:
+        raise ValueError(f"unsupported layer format version {meta['version']} in {path}")
+    mode = 'r' if mmap else None
+    coords = np.load(path / 'coords.npy', mmap_mode=mode)
+    offsets = tuple(np.load(path / f'offsets{level}.npy', mmap_mode=mode) for level in range(meta['offsets']))
+    return shapely.GeometryType[meta['geometry_type']], coords, offsets
+
+def load_layer(path, mmap: bool = True) -> np.ndarray:
+    '''The saved layer as a shapely geometry array'''
+    geometry_type, coords, offsets = load_layer_arrays(path, mmap)
+    if geometry_type == shapely.GeometryType.MISSING:
+        return np.empty(0, dtype=object)
+    return shapely.from_ragged_array(geometry_type, coords, offsets)
+
+def read_wkb(path, chunk_size: int = 100_000) -> Iterator[np.ndarray]:
+    # WKB sequence: every record is a little-endian uint32 length followed by the WKB bytes
+    with open(path, 'rb') as f:
+        chunk = []
+        while header := f.read(4):
+            chunk.append(f.read(struct.unpack('<I', header)[0]))
+            if len(chunk) == chunk_size:
+                yield shapely.from_wkb(chunk)
+                chunk = []
+        if chunk:
+            yield shapely.from_wkb(chunk)
+
+def write_wkb(path, geoms, append: bool = False):
+    # append adds records to an existing file, e.g. to fill it chunk by chunk
+    with open(path, 'ab' if append else 'wb') as f:
+        for wkb in shapely.to_wkb(np.asarray(geoms, dtype=object)):
+            f.write(struct.pack('<I', len(wkb)))
+            f.write(wkb)
+
+def load_wkb(path) -> np.ndarray:
+    '''All records of a WKB sequence file as one geometry array'''
+    chunks = list(read_wkb(path))
+    return np.concatenate(chunks) if chunks else np.empty(0, dtype=object)
@@ -4,34 +4,8 @@ import shapely
 
 import shapely.geometry as geom
 
-def remove_lines_through_polygons(lines, polygons):
-  """
-  Removes lines that intersect with any of the given polygons.
-
-  Args:
-    lines: A list of Shapely LineString objects.
-    polygons: A list of Shapely Polygon objects.
-
-  Returns:
-    A list of Shapely LineString objects that do not intersect with any of the
-    given polygons.
-  """
-
-  # Create a set of all the points that are contained within any of the polygons.
-  polygon_points = set()
-  for polygon in polygons:
-    polygon_points.update(polygon.exterior.coords)
-    for hole in polygon.interiors:
-      polygon_points.update(hole.coords)
-
-  # Filter the lines to only include those that do not intersect with any of the
-  # polygon points.
-  filtered_lines = []
-  for line in lines:
-    if not any(line.intersects(geom.Point(point)) for point in polygon_points):
-      filtered_lines.append(line)
-
-  return filtered_lines
+from playground import remove_lines_through_polygons
+
 
 # Example usage:
 if __name__ == "__main__":
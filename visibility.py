@@ -0,0 +1,252 @@
+"""Tangent visibility graphs around circular obstacles.
+
+Nodes are the points where common tangents touch the obstacle circles. Edges
+are the tangent segments that no other obstacle blocks, plus the arcs that
+hug each circle between neighbouring tangent points. Start and goal points
+can be added as circles of radius 0.
+"""
+import numpy as np
+import shapely
+
+from extra.geometry import Circle, CircleArray
+from extra.tangent import batch_tangent_lines
+from playground import edges_to_csr
+
+
+def point_segment_distance(p: np.ndarray, a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    # row-wise distance from points p to segments a-b, all (K, 2)
+    ab = b - a
+    with np.errstate(divide='ignore', invalid='ignore'):
+        t = np.clip(((p - a) * ab).sum(axis=1) / (ab * ab).sum(axis=1), 0, 1)
+    t = np.nan_to_num(t, nan=0.0) # zero-length segments
+    return np.hypot(*(a + t[:, None] * ab - p).T)
+
+class TangentVisibilityGraph(object):
+    '''Tangent visibility graph over circular obstacles with incremental insert and remove.
+
+    Every candidate tangent segment is kept together with the number of
+    obstacles blocking it, so inserting or removing an obstacle only touches
+    the segments it creates or blocks.
+    '''
+
+    def __init__(self, circles=None, radii=None, max_distance: float|None = None,
+                 tol: float = 1e-9, decimals: int = 9, chunk_size: int = 100_000):
+        '''max_distance limits tangents to obstacles whose centers are that close'''
+        self.max_distance = max_distance
+        self.tol = tol
+        self.decimals = decimals
+        self.chunk_size = chunk_size
+        # obstacles; ids are row numbers and stay stable across removals
+        self._xy = np.empty((0, 2))
+        self._r = np.empty(0)
+        self._alive = np.empty(0, dtype=bool)
+        # candidate tangent segments
+        self._ends = np.empty((0, 2, 2))
+        self._owners = np.empty((0, 2), dtype=np.intp)
+        self._blocked = np.empty(0, dtype=np.intp)
+        # (segment, obstacle) rows, one per blocking obstacle
+        self._blockers = np.empty((0, 2), dtype=np.intp)
+        if circles is not None:
+            self.insert(circles, radii)
+
+    def __len__(self):
+        return int(self._alive.sum())
+
+    @property
+    def ids(self) -> np.ndarray:
+        return np.flatnonzero(self._alive)
+
+    def insert(self, circles, radii=None) -> np.ndarray:
+        '''Adds obstacles given as a CircleArray, Circle objects or (K, 2) centers plus radii; returns their ids'''
+        if isinstance(circles, Circle):
+            circles = [circles]
+        if radii is None and not isinstance(circles, CircleArray):
+            circles = CircleArray.from_objects(circles)
+        if isinstance(circles, CircleArray):
+            xy, radii = np.column_stack((circles.X, circles.Y)), circles.radius
+        else:
+            xy = np.asarray(circles, dtype=float).reshape(-1, 2)
+        radii = np.broadcast_to(np.asarray(radii, dtype=float), len(xy))
+        if len(xy) == 0:
+            return np.empty(0, dtype=np.intp)
+
+        old = self.ids
+        ids = np.arange(len(self._r), len(self._r) + len(xy))
+        self._xy = np.concatenate((self._xy, xy))
+        self._r = np.concatenate((self._r, radii))
+        self._alive = np.concatenate((self._alive, np.ones(len(xy), dtype=bool)))
+
+        # existing segments that the new obstacles block
+        if len(self._ends):
+            self._register(*self._hits(np.arange(len(self._ends)), ids))
+
+        # new segments, checked against every obstacle
+        start = len(self._ends)
+        ends, owners = self._tangent_segments(self._pairs(old, ids))
+        self._ends = np.concatenate((self._ends, ends))
+        self._owners = np.concatenate((self._owners, owners))
+        self._blocked = np.concatenate((self._blocked, np.zeros(len(ends), dtype=np.intp)))
+        self._register(*self._hits(np.arange(start, len(self._ends)), self.ids))
+        return ids
+
+    def remove(self, ids):
+        '''Removes obstacles by id; segments they blocked become free again'''
+        ids = np.atleast_1d(np.asarray(ids, dtype=np.intp))
+        self._alive[ids] = False
+        gone = np.isin(self._blockers[:, 1], ids)
+        np.subtract.at(self._blocked, self._blockers[gone, 0], 1)
+        self._blockers = self._blockers[~gone]
+
+        # drop the segments tangent to the removed obstacles
+        keep = ~np.isin(self._owners, ids).any(axis=1)
+        remap = np.cumsum(keep) - 1
+        self._ends, self._owners, self._blocked = self._ends[keep], self._owners[keep], self._blocked[keep]
+        rows = keep[self._blockers[:, 0]]
+        self._blockers = np.column_stack((remap[self._blockers[rows, 0]], self._blockers[rows, 1]))
+
+    def _pairs(self, old: np.ndarray, new: np.ndarray) -> np.ndarray:
+        # obstacle pairs (old, new) and (new, new') that need tangents
+        if self.max_distance is None:
+            cross = np.stack(np.meshgrid(old, new, indexing='ij'), axis=-1).reshape(-1, 2)
+            r, c = np.triu_indices(len(new), 1)
+            return np.concatenate((cross, np.column_stack((new[r], new[c]))))
+        candidates = np.concatenate((old, new))
+        tree = shapely.STRtree(shapely.points(self._xy[candidates]))
+        q, t = tree.query(shapely.points(self._xy[new]), predicate='dwithin', distance=self.max_distance)
+        a, b = new[q], candidates[t]
+        keep = (b < new[0]) | (b > a)
+        return np.column_stack((a[keep], b[keep]))
+
+    def _tangent_segments(self, pairs: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        ends, owners = [np.empty((0, 2, 2))], [np.empty((0, 2), dtype=np.intp)]
+        for k in range(0, len(pairs), self.chunk_size):
+            i, j = pairs[k:k + self.chunk_size].T
+            _, points = batch_tangent_lines(self._xy[i], self._r[i], self._xy[j], self._r[j])
+            valid = ~np.isnan(points[:, :, 0, 0])
+            # touching circles give a zero-length tangent at the contact point
+            valid &= np.hypot(*(points[:, :, 1] - points[:, :, 0]).transpose(2, 0, 1)) > self.tol
+            ends.append(points[valid])
+            owners.append(np.repeat(np.column_stack((i, j)), valid.sum(axis=1), axis=0))
+        return np.concatenate(ends), np.concatenate(owners)
+
+    def _hits(self, segments: np.ndarray, ids: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        # (segment, obstacle) pairs where an obstacle interior meets a segment
+        if len(segments) == 0 or len(ids) == 0:
+            return np.empty(0, dtype=np.intp), np.empty(0, dtype=np.intp)
+        x, y, r = self._xy[ids, 0], self._xy[ids, 1], self._r[ids]
+        tree = shapely.STRtree(shapely.box(x - r, y - r, x + r, y + r))
+        s, c = tree.query(shapely.linestrings(self._ends[segments]))
+        s, c = segments[s], ids[c]
+        keep = (self._owners[s, 0] != c) & (self._owners[s, 1] != c)
+        s, c = s[keep], c[keep]
+        d = point_segment_distance(self._xy[c], self._ends[s, 0], self._ends[s, 1])
+        hit = d < self._r[c] - self.tol
+        return s[hit], c[hit]
+
+    def _register(self, s: np.ndarray, c: np.ndarray):
+        self._blockers = np.concatenate((self._blockers, np.column_stack((s, c))))
+        np.add.at(self._blocked, s, 1)
+
+    def _arcs(self, points: np.ndarray, owners: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        # arcs between angularly neighbouring tangent points on the same circle;
+        # an arc counts as blocked when any part of it runs inside another obstacle
+        keep = self._r[owners] > self.tol
+        points, owners = points[keep], owners[keep]
+        if len(owners) == 0:
+            # no free tangent touches a circle, so there is nothing to connect
+            return np.empty((0, 2)), np.empty((0, 2)), np.empty(0)
+        rel = points - self._xy[owners]
+        angles = np.arctan2(rel[:, 1], rel[:, 0])
+        order = np.lexsort((angles, owners))
+        points, owners, angles = points[order], owners[order], angles[order]
+
+        starts = np.flatnonzero(np.r_[True, owners[1:] != owners[:-1]])
+        sizes = np.diff(np.r_[starts, len(owners)])
+        nxt = np.arange(len(owners)) + 1
+        nxt[starts + sizes - 1] = starts # wrap around each circle
+        single = np.repeat(sizes == 1, sizes)
+        a, b = np.flatnonzero(~single), nxt[~single]
+
+        span = np.mod(angles[b] - angles[a], 2 * np.pi)
+        c = owners[a]
+        free = np.ones(len(a), dtype=bool)
+        ids = self.ids
+        if len(a) and len(ids):
+            blocked = self._arc_hits(c, angles[a], span, ids)
+            free[blocked] = False
+        return points[a[free]], points[b[free]], (self._r[c] * span)[free]
+
+    def _arc_hits(self, c: np.ndarray, start: np.ndarray, span: np.ndarray, ids: np.ndarray) -> np.ndarray:
+        # arcs (rows of c) that run inside another obstacle somewhere along their span
+        x, y, r = self._xy[ids, 0], self._xy[ids, 1], self._r[ids]
+        cx, cy, cr = self._xy[c, 0], self._xy[c, 1], self._r[c]
+        q, t = shapely.STRtree(shapely.box(x - r, y - r, x + r, y + r)).query(
+            shapely.box(cx - cr, cy - cr, cx + cr, cy + cr))
+        t = ids[t]
+        q, t = q[t != c[q]], t[t != c[q]]
+        r1, r2 = self._r[c[q]], self._r[t]
+        delta = self._xy[t] - self._xy[c[q]]
+        d = np.hypot(*delta.T)
+        # the owner circle either lies inside obstacle t or crosses its boundary
+        inside = d + r1 < r2 - self.tol
+        crossing = (d < r1 + r2 - self.tol) & (d > np.abs(r1 - r2)) & (r2 > self.tol)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            half = np.arccos(np.clip((d*d + r1*r1 - r2*r2) / (2 * d * r1), -1, 1))
+        # angular interval [phi - half, phi + half] of the owner circle inside t,
+        # trimmed by tol so that arcs ending on t's boundary stay free
+        half = half - self.tol / r1
+        lo = np.mod(np.arctan2(delta[:, 1], delta[:, 0]) - half - start[q], 2 * np.pi)
+        overlaps = (lo < span[q]) | (lo + 2 * half > 2 * np.pi)
+        return q[inside | (crossing & (half > 0) & overlaps)]
+
+    def edge_list(self) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        '''Returns nodes (V, 2), edges (E, 2) as node indices and edge weights (E,)'''
+        live = self._blocked == 0
+        ends, owners = self._ends[live], self._owners[live]
+        seg_w = np.hypot(*(ends[:, 1] - ends[:, 0]).T)
+        arc_a, arc_b, arc_w = self._arcs(ends.reshape(-1, 2), owners.reshape(-1))
+
+        starts = np.concatenate((ends[:, 0], arc_a))
+        stops = np.concatenate((ends[:, 1], arc_b))
+        weights = np.concatenate((seg_w, arc_w))
+        nodes, inverse = np.unique(np.round(np.concatenate((starts, stops)), self.decimals),
+                                   axis=0, return_inverse=True)
+        edges = np.sort(inverse.reshape(2, -1).T, axis=1)
+
+        # keep the lightest of parallel edges and drop self loops
+        order = np.lexsort((weights, edges[:, 1], edges[:, 0]))
+        edges, weights = edges[order], weights[order]
+        first = np.r_[True, (edges[1:] != edges[:-1]).any(axis=1)] & (edges[:, 0] != edges[:, 1])
+        return nodes, edges[first], weights[first]
+
+    def to_networkx(self):
+        '''Weighted networkx Graph whose nodes are (x, y) tuples'''
+        import networkx as nx
+
+        nodes, edges, weights = self.edge_list()
+        G = nx.Graph()
+        G.add_nodes_from(map(tuple, nodes.tolist()))
+        nodes = nodes.tolist()
+        G.add_weighted_edges_from((tuple(nodes[u]), tuple(nodes[v]), w)
+                                  for (u, v), w in zip(edges.tolist(), weights.tolist()))
+        return G
+
+    def to_csr(self) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        '''Returns nodes and a symmetric (indptr, indices, data) adjacency'''
+        nodes, edges, weights = self.edge_list()
+        return (nodes, *edges_to_csr(edges[:, 0], edges[:, 1], weights, len(nodes)))
+
+
+if __name__ == "__main__":
+    import networkx as nx
+
+    tvg = TangentVisibilityGraph([Circle(0, 0, 0, 2), Circle(6, 1, 0, 1.5), Circle(3, 5, 0, 1)])
+    start, goal = tvg.insert([(-4, -1), (10, 3)], radii=0)
+    G = tvg.to_networkx()
+    path = nx.shortest_path(G, (-4.0, -1.0), (10.0, 3.0), weight='weight')
+    print(f"{G.number_of_nodes()} nodes, {G.number_of_edges()} edges")
+    print(f"Shortest path: {path}")
+
+    tvg.remove(0)
+    G = tvg.to_networkx()
+    print(f"Without obstacle 0: {nx.shortest_path_length(G, (-4.0, -1.0), (10.0, 3.0), weight='weight')}")